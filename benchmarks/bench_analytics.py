@@ -0,0 +1,64 @@
+'''GraphAnalytics (scipy.sparse) against the networkx equivalents on the same graph
+
+Usage:
+    python -m benchmarks.bench_analytics [--nodes 20000] [--degree 10]
+
+The graph is the random citation graph of bench_graph. Each row shows the time of both implementations
+and whether they agree (max abs. difference of PageRank, equality of the degrees, core numbers and co-citation counts).
+'''
+import argparse
+import itertools
+import time
+from collections import Counter
+import networkx as nx
+
+from utils.analytics import GraphAnalytics
+from benchmarks.bench_graph import build
+
+def timed(fn):
+    start = time.perf_counter()
+    res = fn()
+    return res, time.perf_counter() - start
+
+def nx_co_citation(graph:nx.DiGraph) -> Counter:
+    counts = Counter()
+    for node in graph.nodes:
+        for a, b in itertools.combinations(sorted(graph.predecessors(node)), 2):
+            counts[(a, b)] += 1
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=20000)
+    parser.add_argument('--degree', type=int, default=10)
+    args = parser.parse_args()
+
+    graph = build(nx.DiGraph(), args.nodes, args.degree)
+    print(f'nodes: {graph.number_of_nodes()}, edges: {graph.number_of_edges()}')
+    print(f'{"metric":14s}{"networkx s":>12s}{"sparse s":>12s}{"speedup":>10s}  agreement')
+
+    analytics, setup_sec = timed(lambda: GraphAnalytics(graph))
+    print(f'{"(setup)":14s}{"":>12s}{setup_sec:12.3f}')
+
+    def row(name:str, nx_sec:float, sparse_sec:float, agreement:str):
+        print(f'{name:14s}{nx_sec:12.3f}{sparse_sec:12.3f}{nx_sec / sparse_sec:10.1f}  {agreement}')
+
+    expected, nx_sec = timed(lambda: nx.pagerank(graph.reverse(copy=False)))
+    actual, sparse_sec = timed(lambda: dict(analytics.pagerank()))
+    row('pagerank', nx_sec, sparse_sec, f'max abs diff {max(abs(expected[n] - actual[n]) for n in graph.nodes):.2e}')
+
+    expected, nx_sec = timed(lambda: dict(graph.in_degree()))
+    actual, sparse_sec = timed(lambda: dict(analytics.in_degree()))
+    row('in_degree', nx_sec, sparse_sec, f'equal {all(expected[n] == actual[n] for n in graph.nodes)}')
+
+    expected, nx_sec = timed(lambda: nx.core_number(graph))
+    actual, sparse_sec = timed(lambda: dict(analytics.core_number()))
+    row('core_number', nx_sec, sparse_sec, f'equal {all(expected[n] == actual[n] for n in graph.nodes)}')
+
+    expected, nx_sec = timed(lambda: nx_co_citation(graph))
+    actual, sparse_sec = timed(lambda: analytics.co_citation(top=0))
+    actual = {tuple(sorted((a, b))): c for a, b, c in actual}
+    row('co_citation', nx_sec, sparse_sec, f'equal {expected == actual}')
+
+if __name__ == '__main__':
+    main()
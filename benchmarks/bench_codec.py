@@ -0,0 +1,44 @@
+'''round-trip and throughput of the cached-paper codecs
+
+Usage:
+    python -m benchmarks.bench_codec [--papers 1000] [--dim 768]
+
+Compares the legacy pretty-printed JSON (json.dump(indent=2) + Paper.from_dict)
+with the binary codec (msgpack metadata + raw float32 embedding).
+'''
+import argparse
+import time
+import numpy as np
+
+from utils.common import Paper
+from utils.codec import CODECS, decode_paper
+from utils.ss_stub import synthetic_papers
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=1000)
+    parser.add_argument('--dim', type=int, default=768)
+    args = parser.parse_args()
+
+    papers = [Paper(**data) for data in synthetic_papers(args.papers, embedding_dim=args.dim)]
+    print(f'papers: {args.papers}, embedding dim: {args.dim}')
+    print(f'{"codec":10s}{"bytes/paper":>14s}{"encode/s":>14s}{"decode/s":>14s}{"round-trip":>12s}')
+
+    for name, codec in CODECS.items():
+        start = time.perf_counter()
+        blobs = [codec.encode(paper) for paper in papers]
+        encode_sec = time.perf_counter() - start
+
+        start = time.perf_counter()
+        decoded = [decode_paper(blob) for blob in blobs]
+        decode_sec = time.perf_counter() - start
+
+        ok = all(
+            a.to_dict() == {**b.to_dict(), 'at': a.to_dict()['at']} and np.array_equal(a.embedding, b.embedding)
+            for a, b in zip(papers, decoded)
+        )
+        print(f'{name:10s}{sum(len(b) for b in blobs) / len(blobs):14.0f}'
+              f'{len(papers) / encode_sec:14.0f}{len(papers) / decode_sec:14.0f}{str(ok):>12s}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''scaling of build_reference_graph on synthetic citation graphs
+
+Usage:
+    python -m benchmarks.bench_crawl [--sizes 1000 4000 16000] [--citations 10] [--workers 1 4 16] [--latency 0.0]
+
+Every graph is served by a local SemanticScholarStub and crawled from its first paper
+(which transitively reaches every other paper) into an empty temporary store.
+The cost per edge should stay flat as the graph grows, and with `--latency` (seconds added
+to every response of the stub to emulate the API) the wall-clock time should drop with the number of crawl workers.
+'''
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from pathlib import Path
+
+from utils.pf_utils import PaperFinderUtil
+from utils.semanticscholar import SemanticScholar
+from utils.store import open_store
+from utils.ss_stub import SemanticScholarStub, synthetic_papers
+
+def crawl(n_papers:int, n_citations:int, workers:int, latency:float) -> dict:
+    papers = synthetic_papers(n_papers, n_citations=n_citations, embedding_dim=8)
+    with SemanticScholarStub(papers, latency=latency) as stub, \
+         tempfile.TemporaryDirectory() as tmp:
+        pf_util = PaperFinderUtil(store=open_store(Path(tmp) / 'papers', scan=False), paper_cache_size=0)
+        pf_util.ss = SemanticScholar(base_url=stub.url, rate_limit=1e6, burst=workers, max_workers=4)
+
+        start = time.perf_counter()
+        # the crawl prints one line per edge
+        with contextlib.redirect_stdout(io.StringIO()):
+            pf_util.build_reference_graph('P00000000', min_influential_citation_count=0, max_depth=n_papers,
+                                          graph_dir=Path(tmp) / 'graphs', export_interval=n_papers * n_citations, workers=workers)
+        elapsed = time.perf_counter() - start
+        return {
+            'nodes': pf_util.graph.number_of_nodes(),
+            'edges': pf_util.graph.number_of_edges(),
+            'sec': elapsed,
+            'requests': stub.stats['requests'],
+        }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 4000, 16000])
+    parser.add_argument('--citations', type=int, default=10)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1])
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    print(f'{"papers":>8s}{"workers":>8s}{"nodes":>8s}{"edges":>9s}{"requests":>10s}{"sec":>9s}{"us/edge":>10s}')
+    for n_papers in args.sizes:
+        for workers in args.workers:
+            res = crawl(n_papers, args.citations, workers, args.latency)
+            print(f'{n_papers:8d}{workers:8d}{res["nodes"]:8d}{res["edges"]:9d}{res["requests"]:10d}'
+                  f'{res["sec"]:9.2f}{res["sec"] / max(res["edges"], 1) * 1e6:10.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+'''latency of EmbeddingIndex: exact (brute-force) search vs the IVF index, and the recall of the latter
+
+Usage:
+    python -m benchmarks.bench_embedding_index [--papers 200000] [--dim 768] [--queries 20] [--n-probe 1 4 16]
+
+The vectors are random clusters written into a temporary index (memory-mapped as in the real one).
+recall@k is the share of the exact top-k found by the IVF search.
+'''
+import argparse
+import tempfile
+import time
+import numpy as np
+
+from utils.embedding_index import EmbeddingIndex
+
+def synthetic(n_papers:int, dim:int, n_clusters:int=256, seed:int=0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    vectors = np.empty((n_papers, dim), dtype=np.float32)
+    for offset in range(0, n_papers, 65536):
+        size = min(65536, n_papers - offset)
+        vectors[offset:offset + size] = centers[rng.integers(0, n_clusters, size=size)] \
+            + 0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+    return vectors
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=200000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--n-probe', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = EmbeddingIndex.write(tmp, (f'P{i:08d}' for i in range(args.papers)), synthetic(args.papers, args.dim))
+        start = time.perf_counter()
+        index.build_ivf()
+        ivf_sec = time.perf_counter() - start
+        print(f'papers: {len(index)}, dim: {index.dim}, IVF build: {ivf_sec:.1f} s')
+
+        paper_ids = [f'P{i:08d}' for i in np.random.default_rng(1).integers(0, args.papers, size=args.queries)]
+        start = time.perf_counter()
+        exact = [index.similar_papers(paper_id, k=args.k) for paper_id in paper_ids]
+        exact_sec = (time.perf_counter() - start) / args.queries
+        print(f'{"search":14s}{"ms/query":>10s}{"recall@" + str(args.k):>12s}')
+        print(f'{"exact":14s}{exact_sec * 1e3:10.1f}{1.0:12.3f}')
+
+        queries = np.stack([index.vector(paper_id) for paper_id in paper_ids])
+        start = time.perf_counter()
+        index.search_by_vector(queries, k=args.k)
+        print(f'{"exact batched":14s}{(time.perf_counter() - start) / args.queries * 1e3:10.1f}{1.0:12.3f}')
+
+        for n_probe in args.n_probe:
+            start = time.perf_counter()
+            approx = [index.similar_papers(paper_id, k=args.k, n_probe=n_probe) for paper_id in paper_ids]
+            approx_sec = (time.perf_counter() - start) / args.queries
+            recall = np.mean([
+                len({i for i, _ in a} & {i for i, _ in e}) / max(len(e), 1) for a, e in zip(approx, exact)
+            ])
+            print(f'{"ivf n_probe=" + str(n_probe):14s}{approx_sec * 1e3:10.1f}{recall:12.3f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+'''memory and query cost of the graph backends (nx.DiGraph vs CSRGraph)
+
+Usage:
+    python -m benchmarks.bench_graph [--nodes 100000] [--degree 10]
+
+Builds a random citation graph with the 11 node attributes set by build_reference_graph
+through the same add_node/add_edge calls, then measures the memory held by the graph
+and the time of the degree queries.
+'''
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+import networkx as nx
+import numpy as np
+
+from utils.csr_graph import CSRGraph
+
+def attrs(i:int) -> dict:
+    return {
+        'name': f'P{i:08d}', 'paper_id': f'P{i:08d}', 'title': f'synthetic paper {i}', 'year': 2000 + i % 20,
+        'venue': 'arXiv', 'reference_count': i % 50, 'citation_count': i % 70, 'influential_citation_count': i % 5,
+        'first_author_name': f'author {i}', 'first_author_id': f'A{i:08d}', 'primary_category': 'cs.CL',
+    }
+
+def build(graph, n_nodes:int, degree:int, seed:int=0):
+    rng = random.Random(seed)
+    for i in range(n_nodes):
+        graph.add_node(f'P{i:08d}', **attrs(i))
+    for i in range(1, n_nodes):
+        for _ in range(degree):
+            graph.add_edge(f'P{rng.randrange(0, i):08d}', f'P{i:08d}')
+    return graph
+
+def measure(name:str, factory, n_nodes:int, degree:int):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    graph = build(factory(), n_nodes, degree)
+    if isinstance(graph, CSRGraph):
+        # the adjacency arrays are part of the footprint
+        _ = graph.csr, graph.csc
+    build_sec = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    if isinstance(graph, CSRGraph):
+        in_degree = graph.in_degree()
+        top = [int(in_degree[i]) for i in np.argsort(-in_degree)[:10]]
+    else:
+        in_degree = dict(graph.in_degree())
+        top = [in_degree[node] for node in sorted(in_degree, key=in_degree.get, reverse=True)[:10]]
+    query_sec = time.perf_counter() - start
+    print(f'{name:10s}{graph.number_of_edges():10d}{memory / 1e6:12.1f}{memory / n_nodes:12.0f}{build_sec:10.2f}{query_sec * 1e3:12.2f}{top[0]:10d}')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=100000)
+    parser.add_argument('--degree', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f'nodes: {args.nodes}, degree: {args.degree}')
+    print(f'{"backend":10s}{"edges":>10s}{"MB":>12s}{"B/node":>12s}{"build s":>10s}{"top-10 ms":>12s}{"max in":>10s}')
+    measure('networkx', nx.DiGraph, args.nodes, args.degree)
+    measure('csr', CSRGraph, args.nodes, args.degree)
+
+if __name__ == '__main__':
+    main()
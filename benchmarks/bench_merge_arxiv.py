@@ -0,0 +1,67 @@
+'''wall-clock time of merge_arxiv against a SemanticScholar stub with latency
+
+Usage:
+    python -m benchmarks.bench_merge_arxiv [--papers 1000] [--workers 1 8 32] [--latency 0.05]
+
+arXiv files (one per paper of a synthetic graph, without ss_id) are merged into an empty store,
+then merged again: the second run finds every paper in the merge ledger, so it only stats the files.
+'''
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from utils.pf_utils import PaperFinderUtil
+from utils.semanticscholar import SemanticScholar
+from utils.store import open_store
+from utils.ss_stub import SemanticScholarStub, synthetic_papers
+
+def write_arxiv(papers:list, arxiv_dir:Path):
+    for i, paper in enumerate(papers):
+        paper_hash = hashlib.md5(paper['title'].encode('utf-8')).hexdigest()
+        path = arxiv_dir / paper_hash[0] / paper_hash[1] / paper_hash[2] / f'{paper_hash}.json'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'id': f'http://arxiv.org/abs/2101.{i:05d}v1', 'hash': paper_hash, 'title': paper['title'],
+                'authors': [{'name': author['name']} for author in paper['authors']], 'summary': paper['abstract'],
+                'doi': '', 'primary_category': 'cs.CL', 'categories': ['cs.CL'], 'url': '', 'pdf_url': '',
+                'updated': '2021-01-01 00:00:00', 'published': '2021-01-01 00:00:00', 'ss_id': '',
+            }, f, ensure_ascii=False, indent=2)
+
+def merge(papers:list, workers:int, latency:float) -> dict:
+    with SemanticScholarStub(papers, latency=latency) as stub, tempfile.TemporaryDirectory() as tmp:
+        write_arxiv(papers, Path(tmp) / 'arxiv')
+        pf_util = PaperFinderUtil(store=open_store(Path(tmp) / 'papers', scan=False), paper_cache_size=0)
+        pf_util.ss = SemanticScholar(base_url=stub.url, rate_limit=1e6, burst=workers, max_workers=4)
+
+        res = {}
+        for run in ['first', 'second']:
+            requests = stub.stats['requests']
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                pf_util.merge_arxiv(arxiv_dir=Path(tmp) / 'arxiv', ss_dir=Path(tmp) / 'merged', workers=workers)
+            res[run] = (time.perf_counter() - start, stub.stats['requests'] - requests)
+        res['merged'] = len(open_store(Path(tmp) / 'merged'))
+        return res
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=1000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    papers = synthetic_papers(args.papers, n_citations=5, embedding_dim=8)
+    print(f'papers: {args.papers}, latency: {args.latency} s')
+    print(f'{"workers":>8s}{"merged":>8s}{"1st s":>8s}{"1st reqs":>10s}{"2nd s":>8s}{"2nd reqs":>10s}')
+    for workers in args.workers:
+        res = merge(papers, workers, args.latency)
+        print(f'{workers:8d}{res["merged"]:8d}{res["first"][0]:8.1f}{res["first"][1]:10d}{res["second"][0]:8.2f}{res["second"][1]:10d}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+'''memory per paper and attribute-access cost of utils.common.Paper
+
+Usage:
+    python -m benchmarks.bench_paper [--papers 2000] [--dim 768] [--citations 50]
+
+`LegacyPaper` reproduces the previous getattr-based implementation for comparison.
+'''
+from typing import Any, List
+import argparse
+import json
+import timeit
+import tracemalloc
+import numpy as np
+
+from utils.common import Paper, Author, RefPaper
+from utils.ss_stub import synthetic_papers
+
+class LegacyPaper(object):
+    '''the accessors of Paper before __slots__ (attributes set via setattr, rebuilt on every access)'''
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            if value is not None:
+                setattr(self, f'__{key}', value)
+
+    def __get(self, key:str, default:Any) -> Any:
+        value = getattr(self, key) if hasattr(self, key) else default
+        return default if value is None else value
+
+    @property
+    def influential_citation_count(self) -> int:
+        return int(self.__get('__influentialCitationCount', default=0))
+    @property
+    def embedding(self) -> np.ndarray:
+        embedding = self.__get('__embedding', default={})
+        return np.array(embedding['vector']) if 'vector' in embedding else np.array([])
+    @property
+    def authors(self) -> List[Author]:
+        return [Author(a['authorId'] or '', a['name'] or '') for a in self.__get('__authors', default=[])]
+    @property
+    def citations(self) -> List[RefPaper]:
+        return [RefPaper(p['paperId'], p['title']) for p in self.__get('__citations', default=[])]
+
+def memory_per_paper(cls, responses:List[str]) -> float:
+    '''memory retained by papers decoded from API responses'''
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    papers = [cls(**json.loads(response)) for response in responses]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del papers
+    return (after - before) / len(responses)
+
+def access_cost(paper, attr:str, number:int) -> float:
+    return timeit.timeit(lambda: getattr(paper, attr), number=number) / number
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=2000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--citations', type=int, default=50)
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    data = synthetic_papers(args.papers, n_citations=args.citations, embedding_dim=args.dim)
+    hub = max(data, key=lambda p: len(p['citations']))
+    print(f'papers: {args.papers}, embedding dim: {args.dim}, hub citations: {len(hub["citations"])}')
+
+    responses = [json.dumps(item) for item in data]
+    print(f'{"":28s}{"legacy":>14s}{"slots":>14s}')
+    print(f'{"memory / paper (bytes)":28s}{memory_per_paper(LegacyPaper, responses):14.0f}{memory_per_paper(Paper, responses):14.0f}')
+    legacy, compact = LegacyPaper(**hub), Paper(**hub)
+    for attr in ['influential_citation_count', 'citations', 'authors', 'embedding']:
+        print(f'{attr + " (usec)":28s}'
+              f'{access_cost(legacy, attr, args.number) * 1e6:14.2f}'
+              f'{access_cost(compact, attr, args.number) * 1e6:14.2f}')
+
+if __name__ == '__main__':
+    main()
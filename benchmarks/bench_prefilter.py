@@ -0,0 +1,61 @@
+'''requests and bytes of build_reference_graph with and without the prefilter
+
+Usage:
+    python -m benchmarks.bench_prefilter [--papers 2000] [--citations 10] [--dim 768] [--min-icc 1 3 5] [--group-size 1 8]
+
+A synthetic citation graph (influential citation counts uniform in 0..5) is served by a local SemanticScholarStub
+and crawled from its first paper, once fetching the full details of every neighbour
+and once requesting only the influential citation count of the neighbours first,
+with each `--group-size` (number of the papers whose neighbours are fetched together).
+'''
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from pathlib import Path
+
+from utils.pf_utils import PaperFinderUtil
+from utils.semanticscholar import SemanticScholar
+from utils.store import open_store
+from utils.ss_stub import SemanticScholarStub, synthetic_papers
+
+def crawl(papers:list, min_icc:int, max_depth:int, prefilter:bool, group_size:int) -> dict:
+    with SemanticScholarStub(papers) as stub, tempfile.TemporaryDirectory() as tmp:
+        pf_util = PaperFinderUtil(store=open_store(Path(tmp) / 'papers', scan=False), paper_cache_size=0)
+        pf_util.ss = SemanticScholar(base_url=stub.url, rate_limit=1e6, burst=4)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            pf_util.build_reference_graph('P00000000', min_influential_citation_count=min_icc, max_depth=max_depth,
+                                          graph_dir=Path(tmp) / 'graphs', prefilter=prefilter, group_size=group_size)
+        return {
+            'edges': pf_util.graph.number_of_edges(),
+            'requests': stub.stats['requests'],
+            'papers': stub.stats['papers'],
+            'bytes': stub.stats['bytes'],
+            'decoded_bytes': pf_util.ss.http.stats['bytes'],
+            'sec': time.perf_counter() - start,
+        }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=2000)
+    parser.add_argument('--citations', type=int, default=10)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--depth', type=int, default=100)
+    parser.add_argument('--min-icc', type=int, nargs='+', default=[1, 3, 5])
+    parser.add_argument('--group-size', type=int, nargs='+', default=[1, 8])
+    args = parser.parse_args()
+
+    papers = synthetic_papers(args.papers, n_citations=args.citations, embedding_dim=args.dim)
+    print(f'{"min_icc":>8s}{"prefilter":>10s}{"group":>8s}{"edges":>8s}{"requests":>10s}{"papers":>9s}{"MB (gzip)":>11s}{"MB (json)":>10s}{"sec":>8s}')
+    for min_icc in args.min_icc:
+        for prefilter in [False, True]:
+            for group_size in args.group_size:
+                res = crawl(papers, min_icc, args.depth, prefilter, group_size)
+                print(f'{min_icc:8d}{str(prefilter):>10s}{group_size:8d}{res["edges"]:8d}{res["requests"]:10d}{res["papers"]:9d}'
+                      f'{res["bytes"] / 1e6:11.2f}{res["decoded_bytes"] / 1e6:10.2f}{res["sec"]:8.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+'''hit rate and latency of TitleIndex against a remote title search
+
+Usage:
+    python -m benchmarks.bench_title_index [--titles 200000] [--queries 2000] [--api-latency 0.3]
+
+The index holds random titles; the queries are cached titles (with case and punctuation changes),
+cached titles with other stop words (found by the fuzzy lookup) and titles which are not cached.
+The misses go to a fallback which sleeps `--api-latency` seconds and scores 100 results with ROUGE-L
+like SemanticScholar.get_paper_id.
+'''
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from sumeval.metrics.rouge import RougeCalculator
+
+from utils.title_index import TitleIndex
+
+WORDS = [f'w{i}' for i in range(20000)]
+STOP_WORDS = ['a', 'the', 'of', 'for', 'with', 'on', 'in']
+
+def random_title(rng:random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 14))]
+    words.insert(rng.randrange(1, len(words)), rng.choice(STOP_WORDS))
+    return ' '.join(words)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--titles', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--api-latency', type=float, default=0.3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    titles = [random_title(rng) for _ in range(args.titles)]
+    rouge = RougeCalculator(stopwords=True, stemming=False, word_limit=-1, length_limit=-1, lang="en")
+
+    def fallback(title:str) -> str:
+        time.sleep(args.api_latency)
+        for ref in rng.sample(titles, 100):
+            if rouge.rouge_l(summary=title.lower(), references=ref) > 0.95:
+                return 'remote'
+        return ''
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'titles.tsv'
+        start = time.perf_counter()
+        index = TitleIndex(path)
+        for i, title in enumerate(titles):
+            index.add(f'P{i:08d}', title)
+        index.flush()
+        build_sec = time.perf_counter() - start
+        start = time.perf_counter()
+        index = TitleIndex(path)
+        load_sec = time.perf_counter() - start
+        print(f'titles: {len(index)}, build: {build_sec:.1f} s, load: {load_sec:.1f} s')
+
+        correct = 0
+        kinds = ['exact'] * 6 + ['changed'] * 3 + ['unknown']
+        for _ in range(args.queries):
+            kind = rng.choice(kinds)
+            i = rng.randrange(args.titles)
+            if kind == 'exact':
+                title = titles[i].title() + '.'
+            elif kind == 'changed':
+                # stop words are ignored by ROUGE-L
+                words = [word for word in titles[i].split() if word not in STOP_WORDS]
+                words.insert(rng.randrange(len(words)), rng.choice(STOP_WORDS) + ' ' + rng.choice(STOP_WORDS))
+                title = ' '.join(words)
+            else:
+                title = random_title(rng)
+            paper_id = index.resolve(title, fallback=fallback if 0 < args.api_latency else None)
+            correct += int(paper_id == ('' if kind == 'unknown' else f'P{i:08d}'))
+
+        print(index.report())
+        print(f'correct answers: {correct / args.queries * 100:.1f}%')
+
+if __name__ == '__main__':
+    main()
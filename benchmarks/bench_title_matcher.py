@@ -0,0 +1,112 @@
+'''TitleMatcher against the ROUGE-L loop formerly used by SemanticScholar.get_paper_id
+
+Usage:
+    python -m benchmarks.bench_title_matcher [--arxiv-dir __cache__/arxiv] [--queries 3000] [--results 100]
+
+The titles are read from the arXiv papers under `--arxiv-dir` (as merge_arxiv) or generated if it is not given.
+Each query is scored against `--results` titles, as many as a search response: variants of the query
+(case, punctuation, stop words, a word changed) and random titles. Both implementations must make the same
+accept/reject decision for every pair.
+'''
+import argparse
+import json
+import random
+import re
+import string
+import time
+from glob import glob
+from pathlib import Path
+from typing import List
+from sumeval.metrics.rouge import RougeCalculator
+
+from utils.title_matcher import TitleMatcher
+
+WORDS = (
+    'learning deep neural network networks language model models transformer attention graph representation '
+    'reinforcement self-supervised pre-training contrastive generative adversarial diffusion vision image '
+    'segmentation detection translation machine question answering retrieval efficient scalable robust '
+    'optimization stochastic gradient descent bayesian inference variational autoencoder sparse low-rank '
+    'federated multi-task zero-shot few-shot large-scale benchmark dataset evaluation 3D point cloud speech'
+).split()
+STOP_WORDS = ['a', 'an', 'the', 'of', 'for', 'with', 'on', 'in', 'via', 'towards', 'is', 'all', 'you', 'need']
+
+def random_title(rng:random.Random) -> str:
+    words = [rng.choice(WORDS + STOP_WORDS) for _ in range(rng.randint(4, 14))]
+    title = ' '.join(words).capitalize()
+    if rng.random() < 0.3:
+        title = f'{rng.choice(WORDS).upper()}: {title}'
+    if rng.random() < 0.1:
+        title += ' with $\\mathcal{O}(n)$ cost'
+    return title
+
+def load_titles(arxiv_dir:str) -> List[str]:
+    titles = []
+    for path in glob(str(Path(arxiv_dir) / '**' / '*.json'), recursive=True):
+        with open(path, encoding='utf-8') as f:
+            titles.append(' '.join(json.load(f)['title'].split()))
+    return titles
+
+def variant(title:str, rng:random.Random) -> str:
+    kind = rng.randrange(4)
+    if kind == 0:
+        return title.upper()
+    if kind == 1:
+        return title.replace(' ', ' - ', 1).replace(':', '.')
+    if kind == 2:
+        return f'{rng.choice(STOP_WORDS)} {title}'
+    words = title.split()
+    words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return ' '.join(words)
+
+def rouge_loop(rouge:RougeCalculator, threshold:float, title:str, results:List[str]) -> List[bool]:
+    '''the match loop of get_paper_id before TitleMatcher (every decision instead of the first accepted one)'''
+    for punc in string.punctuation:
+        title = title.replace(punc, ' ')
+    title = re.sub(r'\s\s+', ' ', title, count=1000)
+    decisions = []
+    for result in results:
+        ref_str = result.lower()
+        for punc in string.punctuation:
+            ref_str = ref_str.replace(punc, ' ')
+        ref_str = re.sub(r'\s\s+', ' ', ref_str, count=1000)
+        decisions.append(rouge.rouge_l(summary=title.lower(), references=ref_str) > threshold)
+    return decisions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--arxiv-dir', type=str, default='')
+    parser.add_argument('--queries', type=int, default=3000)
+    parser.add_argument('--results', type=int, default=100)
+    parser.add_argument('--threshold', type=float, default=0.95)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    titles = load_titles(args.arxiv_dir) if args.arxiv_dir != '' else [random_title(rng) for _ in range(args.queries * 2)]
+    queries = [rng.choice(titles) for _ in range(args.queries)]
+    results = []
+    for query in queries:
+        items = [variant(query, rng) for _ in range(args.results // 10)] + rng.sample(titles, args.results - args.results // 10)
+        rng.shuffle(items)
+        results.append(items)
+    print(f'titles: {len(titles)}, queries: {len(queries)}, results per query: {args.results}')
+
+    rouge = RougeCalculator(stopwords=True, stemming=False, word_limit=-1, length_limit=-1, lang="en")
+    start = time.perf_counter()
+    expected = [rouge_loop(rouge, args.threshold, query, items) for query, items in zip(queries, results)]
+    loop_sec = time.perf_counter() - start
+
+    matcher = TitleMatcher(threshold=args.threshold)
+    start = time.perf_counter()
+    actual = [(matcher.scores(query, items) > args.threshold).tolist() for query, items in zip(queries, results)]
+    matcher_sec = time.perf_counter() - start
+
+    pairs = sum(len(items) for items in results)
+    accepted = sum(sum(decisions) for decisions in expected)
+    agreed = sum(e == a for es, as_ in zip(expected, actual) for e, a in zip(es, as_))
+    print(f'{"scorer":14s}{"ms/query":>10s}{"us/pair":>10s}')
+    print(f'{"rouge loop":14s}{loop_sec / len(queries) * 1e3:10.2f}{loop_sec / pairs * 1e6:10.1f}')
+    print(f'{"TitleMatcher":14s}{matcher_sec / len(queries) * 1e3:10.2f}{matcher_sec / pairs * 1e6:10.1f}')
+    print(f'speedup: {loop_sec / matcher_sec:.1f}x | accepted pairs: {accepted} | same decisions: {agreed}/{pairs}')
+
+if __name__ == '__main__':
+    main()
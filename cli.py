@@ -1 +1,47 @@
-import click
\ No newline at end of file
+import click
+
+from utils.store import migrate_store, open_store
+from utils.graph_log import GraphLog
+from utils.embedding_index import EmbeddingIndex
+from utils.title_index import TitleIndex
+
+@click.group()
+def cli():
+    pass
+
+@cli.command('migrate-store')
+@click.option('--src', type=click.Path(exists=True), required=True, help='path to the source store (e.g. __cache__/papers)')
+@click.option('--dst', type=click.Path(), required=True, help='path to the destination store (e.g. __cache__/papers.sqlite)')
+@click.option('--codec', type=click.Choice(['json', 'binary']), default='json', help='format of the papers in the destination store')
+def migrate_store_command(src:str, dst:str, codec:str):
+    '''copy the cached papers from a store into another one'''
+    migrate_store(src, dst, codec=codec)
+
+@cli.command('compact-graph')
+@click.option('--log', 'log_dir', type=click.Path(exists=True), required=True, help='path to the graph log (e.g. __cache__/graphs/<paper_id>.graphlog)')
+@click.option('--out', type=click.Path(), required=True, help='path to the output file')
+@click.option('--format', 'fmt', type=click.Choice(list(GraphLog.FORMATS)), default='graphml', help='format of the output file')
+def compact_graph_command(log_dir:str, out:str, fmt:str):
+    '''write the graph in a graph log as GraphML (or another format)'''
+    outfile = GraphLog(log_dir).compact(out, format=fmt)
+    print(f'Exported: {outfile}')
+
+@cli.command('build-embedding-index')
+@click.option('--store', 'store_path', type=click.Path(exists=True), required=True, help='path to the store of the papers (e.g. __cache__/papers)')
+@click.option('--out', type=click.Path(), default='__cache__/embeddings', help='directory of the index')
+@click.option('--ivf-lists', type=int, default=-1, help='number of the inverted lists of the approximate index (0: sqrt(number of papers), -1: none)')
+def build_embedding_index_command(store_path:str, out:str, ivf_lists:int):
+    '''index the embeddings of the cached papers for the nearest-neighbour search'''
+    index = EmbeddingIndex.build(open_store(store_path), out)
+    if 0 <= ivf_lists and 0 < len(index):
+        index.build_ivf(n_lists=ivf_lists)
+
+@cli.command('build-title-index')
+@click.option('--store', 'store_path', type=click.Path(exists=True), required=True, help='path to the store of the papers (e.g. __cache__/papers)')
+@click.option('--out', type=click.Path(), default='__cache__/titles.tsv', help='path to the title file')
+def build_title_index_command(store_path:str, out:str):
+    '''index the titles of the cached papers for the offline title lookup'''
+    TitleIndex.build(open_store(store_path), out)
+
+if __name__ == '__main__':
+    cli()
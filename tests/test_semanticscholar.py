@@ -0,0 +1,141 @@
+'''SemanticScholar and build_reference_graph against a local SemanticScholarStub
+
+Run from the repository root:
+    python -m pytest -q tests
+'''
+import contextlib
+import io
+from pathlib import Path
+from typing import List
+import pytest
+
+import utils.checkpoint as checkpoint
+from utils.cache import ResponseCache
+from utils.pf_utils import PaperFinderUtil
+from utils.semanticscholar import SemanticScholar
+from utils.ss_stub import SemanticScholarStub, synthetic_papers
+from utils.store import open_store
+
+PAPERS = synthetic_papers(120, n_citations=6, embedding_dim=4)
+
+class RecordingStub(SemanticScholarStub):
+    '''stub remembering the ids of the papers it served'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.served:List[str] = []
+
+    def project(self, paper:dict, fields:List[str]) -> dict:
+        self.served.append(paper['paperId'])
+        return SemanticScholarStub.project(paper, fields)
+
+@pytest.fixture
+def stub():
+    with RecordingStub(PAPERS) as stub:
+        yield stub
+
+def client(stub:SemanticScholarStub, **kwargs) -> SemanticScholar:
+    return SemanticScholar(base_url=stub.url, rate_limit=1e6, burst=8, **kwargs)
+
+def crawl(stub:SemanticScholarStub, root:Path, resume:bool=False, **kwargs) -> PaperFinderUtil:
+    pf_util = PaperFinderUtil(store=open_store(root / 'papers', scan=False), paper_cache_size=0)
+    pf_util.ss = client(stub)
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        pf_util.build_reference_graph('P00000000', min_influential_citation_count=0, max_depth=100,
+                                      graph_dir=root / 'graphs', resume=resume, checkpoint_interval=5, **kwargs)
+    return pf_util
+
+# --- batch requests ---
+
+def test_batch_keeps_order_and_nulls(stub):
+    ss = client(stub)
+    ids = ['P00000003', 'unknown', 'P00000001']
+    papers = ss.get_paper_details_batch(ids)
+    assert [paper.paper_id if paper is not None else None for paper in papers] == ['P00000003', None, 'P00000001']
+    assert stub.stats['requests'] == 1
+
+def test_details_skip_unknown_papers(stub):
+    ss = client(stub, batch_size=3)
+    ids = ['P00000001', 'P00000002', 'unknown', 'P00000004', 'P00000005', 'P00000006', 'P00000007']
+    papers = list(ss.get_paper_details(ids))
+    assert [paper.paper_id for paper in papers] == [i for i in ids if i != 'unknown']
+
+def test_details_are_split_by_batch_size(stub):
+    stub.batch_size = 4
+    ss = client(stub, batch_size=4)
+    ids = [f'P{i:08d}' for i in range(10)]
+    assert [paper.paper_id for paper in ss.get_paper_details(ids)] == ids
+    # 4 + 4 + 2 ids, none rejected by the stub
+    assert stub.stats['requests'] == 3
+    with pytest.raises(ValueError):
+        ss.get_paper_details_batch(ids)
+
+def test_single_and_batch_lookups_share_the_cache(stub):
+    ss = client(stub, cache=ResponseCache())
+    ss.get_paper_details_batch(['P00000001', 'P00000002'])
+    requests = stub.stats['requests']
+    assert ss.get_paper_detail('P00000001').paper_id == 'P00000001'
+    assert stub.stats['requests'] == requests
+
+    ss.get_paper_detail('P00000003')
+    stub.served.clear()
+    ss.get_paper_details_batch(['P00000003', 'P00000004'])
+    assert stub.served == ['P00000004']
+
+def test_refresh_bypasses_the_cache(stub):
+    ss = client(stub, cache=ResponseCache())
+    ss.get_paper_detail('P00000001')
+    stub.served.clear()
+    ss.get_paper_details_batch(['P00000001', 'P00000002'], refresh=True)
+    assert stub.served == ['P00000001', 'P00000002']
+
+# --- crawl ---
+
+@pytest.mark.parametrize('kwargs', [{}, {'max_fanout': 3, 'max_reference_depth': 1}])
+def test_graph_does_not_depend_on_workers(stub, tmp_path, kwargs):
+    graphs = []
+    for workers, group_size in [(1, 1), (3, 1), (8, 4)]:
+        stub.served.clear()
+        graph = crawl(stub, tmp_path / f'{workers}-{group_size}', workers=workers, group_size=group_size, **kwargs).graph
+        graphs.append((list(graph.nodes), sorted(graph.edges)))
+        # a paper shared by the groups fetched concurrently is requested once
+        assert len(stub.served) == len(set(stub.served))
+    assert graphs[0] == graphs[1] == graphs[2]
+
+@pytest.mark.parametrize('kwargs', [{}, {'max_fanout': 3, 'max_reference_depth': 1, 'workers': 4}])
+def test_resume_does_not_request_saved_papers(stub, tmp_path, monkeypatch, kwargs):
+    full = crawl(stub, tmp_path / 'full', **kwargs).graph
+
+    flush, calls = checkpoint.CrawlCheckpoint.flush, []
+    def interrupt(self):
+        flush(self)
+        calls.append(1)
+        if len(calls) == 4:
+            raise KeyboardInterrupt
+    monkeypatch.setattr(checkpoint.CrawlCheckpoint, 'flush', interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        crawl(stub, tmp_path / 'resumed', **kwargs)
+    monkeypatch.setattr(checkpoint.CrawlCheckpoint, 'flush', flush)
+
+    saved = set(open_store(tmp_path / 'resumed' / 'papers'))
+    stub.served.clear()
+    resumed = crawl(stub, tmp_path / 'resumed', resume=True, **kwargs).graph
+    assert 0 < len(saved) and saved.isdisjoint(stub.served)
+    assert set(resumed.edges) == set(full.edges)
+
+    # the crawl is complete: nothing is requested again
+    requests = stub.stats['requests']
+    crawl(stub, tmp_path / 'resumed', resume=True, **kwargs)
+    assert stub.stats['requests'] == requests
+
+@pytest.mark.parametrize('workers, group_size', [(1, 1), (4, 1), (4, 3)])
+def test_best_first_crawl_keeps_to_the_budget(stub, tmp_path, workers, group_size):
+    graphs = []
+    for run in range(2):
+        stub.served.clear()
+        pf_util = crawl(stub, tmp_path / str(run), workers=workers, group_size=group_size,
+                        score='influential_citations', max_fanout=3, max_reference_depth=1, max_papers=40)
+        # every paper requested once and charged once, up to the budget (the root included)
+        assert len(stub.served) == len(set(stub.served)) == len(pf_util.store) == 40
+        graphs.append((list(pf_util.graph.nodes), sorted(pf_util.graph.edges)))
+    assert graphs[0] == graphs[1]
@@ -0,0 +1,125 @@
+from typing import List, Tuple, Union
+from pathlib import Path
+import numpy as np
+import scipy.sparse as sp
+import networkx as nx
+
+from utils.csr_graph import CSRGraph
+from utils.utils import StrOrPath
+
+Ranking = List[Tuple[str, float]]
+
+class GraphAnalytics(object):
+    '''citation-graph analytics with sparse-matrix operations
+
+    Works on the graph built by PaperFinderUtil.build_reference_graph (either backend) or a GraphML file.
+    Edges point from the cited paper to the citing one, so the successors of a paper are the papers citing it.
+    Every ranking is a list of (paper_id, value) sorted by the value in descending order.
+
+    Args:
+        graph (Union[nx.DiGraph, CSRGraph]): citation graph
+    '''
+
+    def __init__(self, graph:Union[nx.DiGraph, CSRGraph]):
+        if isinstance(graph, nx.DiGraph):
+            graph = CSRGraph.from_networkx(graph)
+        self.__ids = np.array(graph.nodes, dtype=object)
+        n = len(self.__ids)
+        indptr, indices = graph.csr
+        # adjacency[i, j] = 1 if i -> j (j cites i)
+        self.__adjacency = sp.csr_matrix((np.ones(len(indices), dtype=np.float64), indices, indptr), shape=(n, n))
+
+    @staticmethod
+    def from_graphml(path:StrOrPath) -> 'GraphAnalytics':
+        return GraphAnalytics(nx.read_graphml(str(Path(path))))
+
+    @property
+    def adjacency(self) -> sp.csr_matrix:
+        return self.__adjacency
+
+    def __ranking(self, values:np.ndarray, top:int) -> Ranking:
+        order = np.argsort(-values, kind='stable')
+        if 0 < top:
+            order = order[:top]
+        return list(zip(self.__ids[order].tolist(), values[order].tolist()))
+
+    def in_degree(self, top:int=0) -> Ranking:
+        '''number of the papers cited by each paper (within the graph)'''
+        return self.__ranking(np.asarray(self.__adjacency.sum(axis=0)).ravel(), top)
+
+    def out_degree(self, top:int=0) -> Ranking:
+        '''number of the papers citing each paper (within the graph)'''
+        return self.__ranking(np.diff(self.__adjacency.indptr).astype(np.float64), top)
+
+    def pagerank(self, alpha:float=0.85, max_iter:int=100, tol:float=1.0e-6, reverse:bool=True, top:int=0) -> Ranking:
+        '''PageRank by power iteration (same conventions as nx.pagerank)
+
+        Args:
+            alpha (float): damping factor
+            max_iter (int): max number of iterations
+            tol (float): error tolerance used to check the convergence (L1 error < n * tol)
+            reverse (bool): rank along the citations (citing -> cited), so that the influential papers come first.
+                            if False, along the edges of the graph
+            top (int): number of the papers returned (0: all)
+        '''
+        matrix = self.__adjacency.T.tocsr() if reverse else self.__adjacency
+        n = matrix.shape[0]
+        if n == 0:
+            return []
+        out_degree = np.asarray(matrix.sum(axis=1)).ravel()
+        dangling = out_degree == 0
+        inv_degree = np.divide(1.0, out_degree, out=np.zeros(n), where=~dangling)
+        # transition[j, i]: probability of i -> j
+        transition = (sp.diags(inv_degree) @ matrix).T.tocsr()
+
+        x = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            last = x
+            x = alpha * (transition @ last) + (alpha * last[dangling].sum() + (1.0 - alpha)) / n
+            if np.abs(x - last).sum() < n * tol:
+                break
+        else:
+            raise nx.PowerIterationFailedConvergence(max_iter)
+        return self.__ranking(x, top)
+
+    def core_number(self, top:int=0) -> Ranking:
+        '''k-core number of each paper on the undirected degree (in + out), as nx.core_number'''
+        symmetric = (self.__adjacency + self.__adjacency.T).tocsr()
+        n = symmetric.shape[0]
+        degree = np.asarray(symmetric.sum(axis=1)).ravel()
+        core = np.zeros(n)
+        alive = np.ones(n, dtype=np.bool_)
+        k = 0.0
+        while alive.any():
+            k = max(k, degree[alive].min())
+            # peel every node whose degree dropped to k or less, until none is left at this level
+            while True:
+                peeled = alive & (degree <= k)
+                if not peeled.any():
+                    break
+                core[peeled] = k
+                alive[peeled] = False
+                degree -= np.asarray(symmetric[peeled].sum(axis=0)).ravel()
+        return self.__ranking(core, top)
+
+    def k_core(self, k:int=-1) -> List[str]:
+        '''papers in the k-core (the main core if k < 0)'''
+        core = dict(self.core_number())
+        if k < 0:
+            k = max(core.values(), default=0)
+        return [paper_id for paper_id, number in core.items() if k <= number]
+
+    def co_citation(self, top:int=100) -> List[Tuple[str, str, int]]:
+        '''pairs of papers cited together most often: (paper_id, paper_id, number of the papers citing both)'''
+        counts = sp.triu(self.__adjacency @ self.__adjacency.T, k=1).tocoo()
+        order = np.argsort(-counts.data, kind='stable')
+        if 0 < top:
+            order = order[:top]
+        return [(self.__ids[i], self.__ids[j], int(c)) for i, j, c in zip(counts.row[order], counts.col[order], counts.data[order])]
+
+    def co_cited_with(self, paper_id:str, top:int=10) -> Ranking:
+        '''papers cited together with a paper, by the number of the papers citing both'''
+        index = int(np.flatnonzero(self.__ids == paper_id)[0])
+        counts = np.asarray((self.__adjacency[index] @ self.__adjacency.T).todense()).ravel()
+        counts[index] = 0
+        return [(i, c) for i, c in self.__ranking(counts, top) if 0 < c]
@@ -0,0 +1,192 @@
+from typing import Any, Callable, Hashable, Optional
+from pathlib import Path
+from collections import OrderedDict
+import urllib.parse
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+
+from utils.utils import StrOrPath
+
+class LRUCache(object):
+    '''thread-safe LRU cache bounded by the number of items and/or the total size
+
+    `stats` counts hits, misses and evictions.
+
+    Args:
+        max_items (int): max number of items (<= 0: unlimited)
+        max_size (int): max total size of the items measured by `sizeof` (<= 0: unlimited)
+        sizeof (Callable[[Any], int]): size of an item
+    '''
+
+    def __init__(self, max_items:int=10000, max_size:int=0, sizeof:Optional[Callable[[Any], int]]=None):
+        self.__max_items = max_items
+        self.__max_size = max_size
+        self.__sizeof = sizeof if sizeof is not None else (lambda value: 1)
+        self.__items:OrderedDict = OrderedDict()
+        self.__size = 0
+        self.__lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def __contains__(self, key:Hashable) -> bool:
+        return key in self.__items
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    def get(self, key:Hashable, default:Any=None) -> Any:
+        with self.__lock:
+            if key not in self.__items:
+                self.stats['misses'] += 1
+                return default
+            self.stats['hits'] += 1
+            self.__items.move_to_end(key)
+            return self.__items[key][0]
+
+    def put(self, key:Hashable, value:Any):
+        size = self.__sizeof(value)
+        with self.__lock:
+            if key in self.__items:
+                self.__size -= self.__items.pop(key)[1]
+            if 0 < self.__max_size and self.__max_size < size:
+                # never fits
+                return
+            self.__items[key] = (value, size)
+            self.__size += size
+            while (0 < self.__max_items and self.__max_items < len(self.__items)) or \
+                  (0 < self.__max_size and self.__max_size < self.__size):
+                _, (_, evicted_size) = self.__items.popitem(last=False)
+                self.__size -= evicted_size
+                self.stats['evictions'] += 1
+
+    def pop(self, key:Hashable, default:Any=None) -> Any:
+        with self.__lock:
+            if key not in self.__items:
+                return default
+            value, size = self.__items.pop(key)
+            self.__size -= size
+            return value
+
+    def clear(self):
+        with self.__lock:
+            self.__items.clear()
+            self.__size = 0
+
+class ResponseCache(object):
+    '''content-addressed cache of API responses with TTL
+
+    Responses are keyed on the method, the endpoint and the normalized parameters.
+    Recently used responses are kept in memory and, if `path` is given, all of them are stored
+    in a single SQLite file which is bounded by `max_bytes` with LRU eviction.
+
+    Args:
+        path (StrOrPath): path to the SQLite file. memory only if empty
+        ttl (float): time to live of a response in seconds
+        max_items (int): max number of responses kept in memory
+        max_bytes (int): max total size of the responses stored on disk
+    '''
+
+    def __init__(self, path:StrOrPath='', ttl:float=7 * 24 * 3600.0, max_items:int=1000, max_bytes:int=4 * 1024 ** 3):
+        self.__ttl = ttl
+        self.__max_bytes = max_bytes
+        self.__memory = LRUCache(max_items=max_items)
+        self.__lock = threading.Lock()
+        self.__db:Optional[sqlite3.Connection] = None
+        self.__disk_size = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+        if str(path) != '':
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.__db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+            self.__db.execute('PRAGMA journal_mode=WAL')
+            self.__db.execute('PRAGMA synchronous=NORMAL')
+            self.__db.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, expires REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL, body BLOB NOT NULL)')
+            self.__db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+            self.__disk_size = self.__db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def key(method:str, url:str, data:Optional[dict]=None) -> str:
+        '''content address of a request
+
+        The host is ignored, query parameters are sorted and the comma separated `fields` are sorted,
+        so that equivalent requests share a key.
+        '''
+        parsed = urllib.parse.urlsplit(url)
+        params = []
+        for name, value in sorted(urllib.parse.parse_qsl(parsed.query, keep_blank_values=True)):
+            if name == 'fields':
+                value = ','.join(sorted(value.split(',')))
+            params.append((name, value))
+        body = json.dumps(data, sort_keys=True, ensure_ascii=False) if data is not None else ''
+        source = '\n'.join([method.upper(), urllib.parse.unquote(parsed.path), urllib.parse.urlencode(params), body])
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    def get(self, key:str) -> Optional[bytes]:
+        now = time.time()
+        item = self.__memory.get(key)
+        if item is not None:
+            expires, body = item
+            if now < expires:
+                self.stats['hits'] += 1
+                return body
+            self.__memory.pop(key)
+
+        if self.__db is not None:
+            with self.__lock:
+                row = self.__db.execute('SELECT expires, body FROM responses WHERE key = ?', (key,)).fetchone()
+                if row is not None and now < row[0]:
+                    self.__db.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+                    self.__memory.put(key, (row[0], row[1]))
+                    self.stats['hits'] += 1
+                    return row[1]
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key:str, body:bytes):
+        now = time.time()
+        expires = now + self.__ttl
+        self.__memory.put(key, (expires, body))
+        if self.__db is None:
+            return
+
+        with self.__lock:
+            row = self.__db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self.__db.execute('INSERT OR REPLACE INTO responses (key, expires, accessed, size, body) VALUES (?, ?, ?, ?, ?)',
+                              (key, expires, now, len(body), body))
+            self.__disk_size += len(body) - (row[0] if row is not None else 0)
+            if self.__max_bytes < self.__disk_size:
+                self.__evict()
+
+    def __evict(self):
+        '''drop expired responses, then the least recently used ones down to 90% of max_bytes'''
+        self.__db.execute('BEGIN')
+        cursor = self.__db.execute('DELETE FROM responses WHERE expires <= ?', (time.time(),))
+        self.stats['evictions'] += cursor.rowcount
+        self.__disk_size = self.__db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        target = int(self.__max_bytes * 0.9)
+        rows = self.__db.execute('SELECT key, size FROM responses ORDER BY accessed')
+        victims = []
+        for key, size in rows:
+            if self.__disk_size <= target:
+                break
+            victims.append((key,))
+            self.__disk_size -= size
+        rows.close()
+        self.__db.executemany('DELETE FROM responses WHERE key = ?', victims)
+        self.__db.execute('COMMIT')
+        self.stats['evictions'] += len(victims)
+
+    def close(self):
+        if self.__db is not None:
+            self.__db.close()
+            self.__db = None
@@ -0,0 +1,77 @@
+from typing import List, Optional
+from pathlib import Path
+import json
+import os
+
+from utils.utils import StrOrPath
+
+class CrawlCheckpoint(object):
+    '''append-only checkpoint of a crawl (JSON lines)
+
+    The first line is a header describing the crawl, every following line is a record
+    appended by the crawler. Records are buffered and written by `flush`, so the file only
+    grows by whole lines; a line cut by a crash is dropped (and truncated) by `load`.
+
+    Args:
+        path (StrOrPath): path to the checkpoint file
+    '''
+
+    def __init__(self, path:StrOrPath):
+        self.__path = Path(path)
+        self.__pending:List[str] = []
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    @property
+    def pending(self) -> int:
+        '''number of the records not written yet'''
+        return len(self.__pending)
+
+    def exists(self) -> bool:
+        return self.__path.is_file()
+
+    def start(self, header:dict):
+        '''start a new checkpoint (an existing one is discarded)'''
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        self.__pending = []
+        with open(self.__path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header, ensure_ascii=False) + '\n')
+
+    def load(self) -> Optional[List[dict]]:
+        '''the header followed by the records written so far. None if there is no checkpoint'''
+        if not self.exists():
+            return None
+        with open(self.__path, 'rb') as f:
+            data = f.read()
+
+        items, offset = [], 0
+        while offset < len(data):
+            end = data.find(b'\n', offset)
+            if end < 0:
+                break
+            try:
+                items.append(json.loads(data[offset:end]))
+            except ValueError:
+                break
+            offset = end + 1
+
+        if offset < len(data):
+            print(f'Warning: dropped a broken record @{self.__path}:{offset}')
+            with open(self.__path, 'r+b') as f:
+                f.truncate(offset)
+        return items if 0 < len(items) else None
+
+    def append(self, record:dict):
+        self.__pending.append(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def flush(self):
+        '''append the buffered records to the file'''
+        if len(self.__pending) == 0:
+            return
+        with open(self.__path, 'a', encoding='utf-8') as f:
+            f.write(''.join(self.__pending))
+            f.flush()
+            os.fsync(f.fileno())
+        self.__pending = []
@@ -0,0 +1,76 @@
+from typing import Dict, Optional, Union
+import struct
+import json
+import msgpack
+import numpy as np
+
+from utils.common import Paper
+
+class PaperCodec(object):
+    '''serialization format of a cached paper'''
+    name:str = ''
+    suffix:str = ''
+
+    def encode(self, paper:Paper) -> bytes:
+        raise NotImplementedError()
+
+    def decode(self, data:bytes) -> Paper:
+        raise NotImplementedError()
+
+class JsonCodec(PaperCodec):
+    '''Paper.to_dict() as JSON (the legacy format)
+
+    Args:
+        indent (int): indent of the JSON. compact if None
+    '''
+    name:str = 'json'
+    suffix:str = '.json'
+
+    def __init__(self, indent:Optional[int]=2):
+        self.indent = indent
+
+    def encode(self, paper:Paper) -> bytes:
+        return json.dumps(paper.to_dict(), ensure_ascii=False, indent=self.indent).encode('utf-8')
+
+    def decode(self, data:Union[bytes, str]) -> Paper:
+        return Paper.from_dict(json.loads(data))
+
+class BinaryCodec(PaperCodec):
+    '''msgpack metadata followed by the raw little-endian float32 embedding
+
+    layout: MAGIC (4 bytes) | length of the metadata (uint32 LE) | metadata (msgpack) | embedding (float32 LE)
+    '''
+    name:str = 'binary'
+    suffix:str = '.pfb'
+    MAGIC:bytes = b'PFB1'
+    HEADER = struct.Struct('<4sI')
+
+    def encode(self, paper:Paper) -> bytes:
+        data = paper.to_dict()
+        data['embedding'] = []
+        meta = msgpack.packb(data, use_bin_type=True)
+        # a partial paper without the embedding is not loaded
+        embedding = paper.embedding.astype('<f4', copy=False).tobytes() if 'embedding' in paper.fields else b''
+        return self.HEADER.pack(self.MAGIC, len(meta)) + meta + embedding
+
+    def decode(self, data:bytes) -> Paper:
+        magic, length = self.HEADER.unpack_from(data)
+        if magic != self.MAGIC:
+            raise ValueError(f'not a binary paper: {magic}')
+        offset = self.HEADER.size
+        paper_data = msgpack.unpackb(data[offset:offset + length], raw=False)
+        paper_data['embedding'] = np.frombuffer(data, dtype='<f4', offset=offset + length).astype(np.float32)
+        return Paper.from_dict(paper_data)
+
+CODECS:Dict[str, PaperCodec] = {codec.name: codec for codec in [JsonCodec(), BinaryCodec()]}
+
+def get_codec(name:str) -> PaperCodec:
+    if name not in CODECS:
+        raise ValueError(f'unknown codec: {name} (available: {", ".join(CODECS.keys())})')
+    return CODECS[name]
+
+def decode_paper(data:Union[bytes, str]) -> Paper:
+    '''decode a paper written by any codec (detected by the magic bytes)'''
+    if isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:4]) == BinaryCodec.MAGIC:
+        return CODECS['binary'].decode(bytes(data))
+    return CODECS['json'].decode(data)
@@ -1,4 +1,4 @@
-from typing import Any, List
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional, Tuple
 from collections import namedtuple
 from datetime import datetime, timezone, timedelta
 from dateutil.parser import parse as date_parse
@@ -7,187 +7,332 @@ import numpy as np
 Author = namedtuple('Author', ('author_id', 'name'))
 RefPaper = namedtuple('RefPaper', ('paper_id', 'title'))
 
+EMPTY_EMBEDDING = np.zeros(0, dtype=np.float32)
+EMPTY_EMBEDDING.flags.writeable = False
+
+def _str(value:Any) -> str:
+    return '' if value is None else value
+
+def _ref_papers(items:Any) -> Tuple[RefPaper, ...]:
+    return tuple(RefPaper(p['paperId'], p['title']) for p in items)
+
+def _authors(items:Any) -> Tuple[Author, ...]:
+    return tuple(Author(_str(a['authorId']), _str(a['name'])) for a in items)
+
+def _datetime(value:Any) -> Any:
+    return value if value else None
+
+def _parse_date(value:str) -> datetime:
+    '''parse the dates written by to_dict without the cost of dateutil'''
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return date_parse(value)
+
 class Paper(object):
+    '''paper from SemanticScholar (+ arXiv)
+
+    The keyword arguments follow the SemanticScholar API (camelCase) and the arXiv fields (snake_case).
+    Every field is parsed once when it is set: authors, citations and references are immutable tuples
+    and the embedding is a read-only float32 array, so the accessors never allocate.
+
+    A paper fetched with a subset of the API fields (`fields`) is partial: accessing one of the missing fields
+    loads the complete paper once through the loader given by `set_loader`
+    (without a loader the missing fields keep their default values).
+    '''
+    # fields of the SemanticScholar API
+    API_FIELDS:Tuple[str, ...] = (
+        'paperId', 'url', 'title', 'abstract', 'venue', 'year',
+        'referenceCount', 'citationCount', 'influentialCitationCount', 'isOpenAccess', 'fieldsOfStudy',
+        'authors', 'citations', 'references', 'embedding',
+    )
+    # API key -> (slot, parser)
+    FIELDS:Dict[str, Tuple[str, Any]] = {
+        'paperId': ('_paper_id', str),
+        'url': ('_url', str),
+        'title': ('_title', str),
+        'abstract': ('_abstract', str),
+        'venue': ('_venue', str),
+        'year': ('_year', int),
+        'referenceCount': ('_reference_count', int),
+        'citationCount': ('_citation_count', int),
+        'influentialCitationCount': ('_influential_citation_count', int),
+        'isOpenAccess': ('_is_open_access', bool),
+        'fieldsOfStudy': ('_fields_of_study', tuple),
+        'authors': ('_authors', _authors),
+        'citations': ('_citations', _ref_papers),
+        'references': ('_references', _ref_papers),
+        'doi': ('_doi', str),
+        'primary_category': ('_primary_category', str),
+        'categories': ('_categories', tuple),
+        'updated': ('_updated', _datetime),
+        'published': ('_published', _datetime),
+        'arxiv_hash': ('_arxiv_hash', str),
+        'arxiv_id': ('_arxiv_id', str),
+        'arxiv_title': ('_arxiv_title', str),
+        'at': ('_at', float),
+    }
+    __slots__ = tuple(slot for slot, _ in FIELDS.values()) + ('_embedding', '_embed_model', '_fields', '_partial', '_loader')
+
     def __init__(self, **kwargs):
-        for key, value in kwargs.items():
-            if value is not None:
-                setattr(self, f'__{key}', value)
-        
-        if not hasattr(self, '__at'):
-            self.__at = datetime.now().timestamp()
-        
-    def __get(self, key:str, default:Any) -> Any:
-        value = getattr(self, key) if hasattr(self, key) else default
-        if value is None:
-            return default
-        else:
-            return value
-    def __filter_none(self, value:Any, default:Any=''):
-        if value is None:
-            return default
-        else:
-            return value
+        self._paper_id = ''
+        self._url = ''
+        self._title = ''
+        self._abstract = ''
+        self._venue = ''
+        self._year = -1
+        self._reference_count = 0
+        self._citation_count = 0
+        self._influential_citation_count = 0
+        self._is_open_access = False
+        self._fields_of_study = ()
+        self._authors = ()
+        self._citations = ()
+        self._references = ()
+        self._embedding = EMPTY_EMBEDDING
+        self._embed_model = ''
+        self._doi = ''
+        self._primary_category = ''
+        self._categories = ()
+        self._updated = None
+        self._published = None
+        self._arxiv_hash = ''
+        self._arxiv_id = ''
+        self._arxiv_title = ''
+        self._at = datetime.now().timestamp()
+        self._fields:FrozenSet[str] = frozenset(['paperId'])
+        self._partial = True
+        self._loader:Optional[Callable[[str], 'Paper']] = None
+        self.add_fields(**kwargs)
 
     def add_fields(self, **kwargs):
+        held = [key for key in kwargs if key in self.API_FIELDS and key not in self._fields]
+        if 0 < len(held):
+            # a field returned as null by the API is held as well
+            self.__hold(held)
         for key, value in kwargs.items():
-            if value is not None:
-                setattr(self, f'__{key}', value)
+            if value is None:
+                continue
+            if key == 'embedding':
+                self.__set_embedding(value)
+            elif key in self.FIELDS:
+                slot, parse = self.FIELDS[key]
+                setattr(self, slot, parse(value))
+
+    def __hold(self, keys:Iterable[str]):
+        self._fields = self._fields.union(keys)
+        self._partial = len(self._fields) < len(self.API_FIELDS)
+
+    @property
+    def fields(self) -> FrozenSet[str]:
+        '''API fields held by this paper'''
+        return self._fields
+
+    @property
+    def is_complete(self) -> bool:
+        return not self._partial
+
+    def set_loader(self, loader:Optional[Callable[[str], 'Paper']]):
+        '''function loading the complete paper by its id, called once a missing field is accessed'''
+        self._loader = loader
+
+    def __require(self, key:str):
+        if key in self._fields or self._loader is None:
+            return
+        # cleared during the call so that the loader cannot recurse, restored if it fails
+        loader, self._loader = self._loader, None
+        try:
+            other = loader(self._paper_id)
+        except Exception:
+            self._loader = loader
+            raise
+        self.merge(other)
+
+    def merge(self, other:'Paper'):
+        '''take the API fields which this paper does not hold from another paper'''
+        missing = [key for key in other.fields if key not in self._fields]
+        for key in missing:
+            if key == 'embedding':
+                self._embedding, self._embed_model = other._embedding, other._embed_model
+            else:
+                slot = self.FIELDS[key][0]
+                setattr(self, slot, getattr(other, slot))
+        self.__hold(missing)
+
+    def __set_embedding(self, embedding:dict):
+        vector = embedding.get('vector')
+        if vector is not None and len(vector) > 0:
+            array = np.asarray(vector, dtype=np.float32)
+            array.flags.writeable = False
+            self._embedding = array
+        model = embedding.get('model')
+        if model is not None:
+            self._embed_model = model
 
     @property
     def paper_id(self) -> str:
         '''paper id from SemanticScholar'''
-        return self.__get('__paperId', default='')
+        return self._paper_id
     @property
     def url(self) -> str:
         '''url from SemanticScholar'''
-        return self.__get('__url', default='')
+        if self._partial:
+            self.__require('url')
+        return self._url
     @property
     def title(self) -> str:
         '''title from SemanticScholar'''
-        return self.__get('__title', default='')
+        if self._partial:
+            self.__require('title')
+        return self._title
     @property
     def abstract(self) -> str:
         '''abstract from SemanticScholar'''
-        return self.__get('__abstract', default='')
+        if self._partial:
+            self.__require('abstract')
+        return self._abstract
     @property
     def venue(self) -> str:
         '''venue from SemanticScholar'''
-        return self.__get('__venue', default='')
+        if self._partial:
+            self.__require('venue')
+        return self._venue
     @property
     def year(self) -> int:
         '''year from SemanticScholar'''
-        return int(self.__get('__year', default=-1))
+        if self._partial:
+            self.__require('year')
+        return self._year
     @property
     def reference_count(self) -> int:
         '''reference count from SemanticScholar'''
-        return int(self.__get('__referenceCount', default=0))
+        if self._partial:
+            self.__require('referenceCount')
+        return self._reference_count
     @property
     def citation_count(self) -> int:
         '''citation count from SemanticScholar'''
-        return int(self.__get('__citationCount', default=0))
+        if self._partial:
+            self.__require('citationCount')
+        return self._citation_count
     @property
     def influential_citation_count(self) -> int:
         '''influential citation count from SemanticScholar'''
-        return int(self.__get('__influentialCitationCount', default=0))
+        if self._partial:
+            self.__require('influentialCitationCount')
+        return self._influential_citation_count
     @property
     def is_open_access(self) -> bool:
         '''is open access from SemanticScholar'''
-        return self.__get('__isOpenAccess', default=False)
+        if self._partial:
+            self.__require('isOpenAccess')
+        return self._is_open_access
     @property
-    def fields_of_study(self) -> List[str]:
+    def fields_of_study(self) -> Tuple[str, ...]:
         '''fields of study from SemanticScholar'''
-        return self.__get('__fieldsOfStudy', default=[])
+        if self._partial:
+            self.__require('fieldsOfStudy')
+        return self._fields_of_study
     @property
     def embedding(self) -> np.ndarray:
-        '''embedding from SemanticScholar'''
-        embedding = self.__get('__embedding', default={})
-        if embedding is not None and 'vector' in embedding:
-            return np.array(embedding['vector'])
-        else:
-            return np.array([])
+        '''embedding from SemanticScholar (read-only float32)'''
+        if self._partial:
+            self.__require('embedding')
+        return self._embedding
     @property
     def embed_model(self) -> str:
         '''embed model from SemanticScholar'''
-        embedding = self.__get('__embedding', default={})
-        if embedding is not None and 'model' in embedding:
-            return embedding['model']
-        else:
-            return ''
+        if self._partial:
+            self.__require('embedding')
+        return self._embed_model
     @property
-    def authors(self) -> List[Author]:
+    def authors(self) -> Tuple[Author, ...]:
         '''authors from SemanticScholar'''
-        author_list = self.__get('__authors', default=[])
-        return [Author(self.__filter_none(a['authorId']), self.__filter_none(a['name'])) for a in author_list]
+        if self._partial:
+            self.__require('authors')
+        return self._authors
     @property
-    def citations(self) -> List[RefPaper]:
+    def citations(self) -> Tuple[RefPaper, ...]:
         '''citations from SemanticScholar'''
-        citation_list = self.__get('__citations', default=[])
-        return [RefPaper(p['paperId'], p['title']) for p in citation_list]
+        if self._partial:
+            self.__require('citations')
+        return self._citations
     @property
-    def references(self) -> List[RefPaper]:
+    def references(self) -> Tuple[RefPaper, ...]:
         '''references from SemanticScholar'''
-        reference_list = self.__get('__references', default=[])
-        return [RefPaper(p['paperId'], p['title']) for p in reference_list]
+        if self._partial:
+            self.__require('references')
+        return self._references
     @property
     def doi(self) -> str:
         '''doi from arxiv'''
-        return self.__get('__doi', default='')
+        return self._doi
     @property
     def primary_category(self) -> str:
         '''primary_category from arxiv'''
-        return self.__get('__primary_category', default='')
+        return self._primary_category
     @property
-    def categories(self) -> List[str]:
+    def categories(self) -> Tuple[str, ...]:
         '''categories from arxiv'''
-        return self.__get('__categories', default=[])
+        return self._categories
     @property
     def updated(self) -> datetime:
         '''updated from arxiv'''
-        value = self.__get('__updated', default=None)
-        if not value:
-            return None
-        else:
-            return value
+        return self._updated
     @property
     def published(self) -> datetime:
         '''published from arxiv'''
-        value = self.__get('__published', default=None)
-        if not value:
-            return None
-        else:
-            return value
+        return self._published
     @property
     def arxiv_id(self) -> str:
         '''id from arxiv'''
-        value = self.__get('__arxiv_id', default='')
-        return value
+        return self._arxiv_id
     @property
     def arxiv_title(self) -> str:
         '''title from arxiv'''
-        value = self.__get('__arxiv_title', default='')
-        return value
+        return self._arxiv_title
     @property
     def arxiv_hash(self) -> str:
         '''hash from arxiv <- hashlib.md5((paper.title + paper.get_short_id()).encode('utf-8')).hexdigest()'''
-        value = self.__get('__arxiv_hash', default='')
-        return value
+        return self._arxiv_hash
     @property
     def at(self) -> datetime:
         '''timestamp'''
-        ts = self.__get('__at', default=0)
         jst = timezone(timedelta(hours=9))
-        return datetime.fromtimestamp(ts, tz=jst)
+        return datetime.fromtimestamp(self._at, tz=jst)
 
     @property
     def has_arxiv_info(self) -> bool:
         return 0 < len(self.primary_category) or \
                0 < len(self.categories) or \
-               isinstance(self.updated) or \
-               isinstance(self.published)
+               isinstance(self.updated, datetime) or \
+               isinstance(self.published, datetime)
 
     def __str__(self):
-        return f'<Paper id:{self.paper_id} title:{self.title[:15]}... @{self.at.strftime("%Y.%m.%d-%H:%M:%S")}>'
+        return f'<Paper id:{self._paper_id} title:{self._title[:15]}... @{self.at.strftime("%Y.%m.%d-%H:%M:%S")}>'
     def __repr__(self):
         return self.__str__()
 
     def to_dict(self):
-        return {
-            'abstract': self.abstract,
-            'authors': [{'author_id': a.author_id, 'name': a.name} for a in self.authors],
-            'citation_count': self.citation_count,
-            'citations': [{'paper_id': r.paper_id, 'title': r.title} for r in self.citations if r.paper_id is not None],
-            'embed_model': self.embed_model,
-            'embedding': self.embedding.tolist(),
-            'fields_of_study': self.fields_of_study,
-            'influential_citation_count': self.influential_citation_count,
-            'is_open_access': self.is_open_access,
-            'paper_id': self.paper_id,
-            'reference_count': self.reference_count,
-            'references': [{'paper_id': r.paper_id, 'title': r.title} for r in self.references if r.paper_id is not None],
-            'title': self.title,
-            'url': self.url,
-            'venue': self.venue,
-            'year': self.year,
+        # the slots are read directly, so that a partial paper is not loaded
+        data = {
+            'abstract': self._abstract,
+            'authors': [{'author_id': a.author_id, 'name': a.name} for a in self._authors],
+            'citation_count': self._citation_count,
+            'citations': [{'paper_id': r.paper_id, 'title': r.title} for r in self._citations if r.paper_id is not None],
+            'embed_model': self._embed_model,
+            # exact values of the float32 elements, so that the embedding round-trips bit for bit
+            'embedding': self._embedding.tolist(),
+            'fields_of_study': list(self._fields_of_study),
+            'influential_citation_count': self._influential_citation_count,
+            'is_open_access': self._is_open_access,
+            'paper_id': self._paper_id,
+            'reference_count': self._reference_count,
+            'references': [{'paper_id': r.paper_id, 'title': r.title} for r in self._references if r.paper_id is not None],
+            'title': self._title,
+            'url': self._url,
+            'venue': self._venue,
+            'year': self._year,
             'doi': self.doi,
             'primary_category': self.primary_category,
             'categories': [{'category': cat} for cat in self.categories],
@@ -196,9 +341,12 @@ class Paper(object):
             'arxiv_hash': self.arxiv_hash,
             'arxiv_id': self.arxiv_id,
             'arxiv_title': self.arxiv_title,
-            'at': self.__get('__at', default=0),
+            'at': self._at,
         }
- 
+        if self._partial:
+            data['fields'] = sorted(self._fields)
+        return data
+
     @staticmethod
     def from_dict(paper_data:dict):
         kwargs = {
@@ -220,12 +368,16 @@ class Paper(object):
             'doi': paper_data['doi'] if 'doi' in paper_data else '',
             'primary_category': paper_data['primary_category'] if 'primary_category' in paper_data else '',
             'categories': [cat['category'] for cat in paper_data['categories']] if 'categories' in paper_data else [],
-            'updated': date_parse(paper_data['updated']) if 'updated' in paper_data and paper_data['updated'] != '' else None,
-            'published': date_parse(paper_data['published']) if 'published' in paper_data and paper_data['published'] != '' else None,
+            'updated': _parse_date(paper_data['updated']) if 'updated' in paper_data and paper_data['updated'] != '' else None,
+            'published': _parse_date(paper_data['published']) if 'published' in paper_data and paper_data['published'] != '' else None,
             'arxiv_hash': paper_data['arxiv_hash'] if 'arxiv_hash' in paper_data else '',
             'arxiv_id': paper_data['arxiv_id'] if 'arxiv_id' in paper_data else '',
             'arxiv_title': paper_data['arxiv_title'] if 'arxiv_title' in paper_data else '',
             'at': paper_data['at'],
         }
-        return Paper(**kwargs)
-
+        paper = Paper(**kwargs)
+        if 'fields' in paper_data:
+            # a partial paper
+            paper._fields = frozenset(paper_data['fields'])
+            paper._partial = len(paper._fields) < len(Paper.API_FIELDS)
+        return paper
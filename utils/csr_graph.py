@@ -0,0 +1,282 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from xml.sax.saxutils import escape
+import numpy as np
+import networkx as nx
+
+from utils.utils import StrOrPath
+
+class CSRGraph(object):
+    '''compact directed graph: integer-indexed nodes, CSR/CSC adjacency and columnar node attributes
+
+    Nodes are numbered in the order they are added. Edges are appended to int32 arrays and turned into
+    CSR (out-edges) and CSC (in-edges) arrays on demand; duplicated edges are merged as in nx.DiGraph.
+    Numeric node attributes are stored in NumPy columns and the other ones in list columns,
+    so a node costs a few dozen bytes plus its strings instead of a dict per node.
+    `add_node`/`add_edge`/`number_of_nodes`/`number_of_edges` follow the networkx API,
+    so the graph can be built by the same code; use `to_networkx` or `write_graphml` to export it.
+
+    Args:
+        capacity (int): initial number of the nodes and edges allocated
+    '''
+    GRAPHML_HEADER:str = (
+        "<?xml version='1.0' encoding='utf-8'?>\n"
+        '<graphml xmlns="http://graphml.graphdrawing.org/xmlns" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        'xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">'
+    )
+
+    def __init__(self, capacity:int=1024):
+        self.__index:Dict[str, int] = {}
+        self.__ids:List[str] = []
+        self.__columns:Dict[str, Union[np.ndarray, list]] = {}
+        self.__node_capacity = max(capacity, 1)
+        self.__src = np.zeros(max(capacity, 1), dtype=np.int32)
+        self.__dst = np.zeros(max(capacity, 1), dtype=np.int32)
+        self.__n_edges = 0
+        # number of the leading edges which are sorted and unique
+        self.__n_compacted = 0
+        self.__csr:Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self.__csc:Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def __contains__(self, node_id:str) -> bool:
+        return node_id in self.__index
+
+    @property
+    def nodes(self) -> List[str]:
+        '''ids of the nodes in the order of their indices'''
+        return self.__ids
+
+    def index(self, node_id:str) -> int:
+        return self.__index[node_id]
+
+    def number_of_nodes(self) -> int:
+        return len(self.__ids)
+
+    def number_of_edges(self) -> int:
+        self.__compact()
+        return self.__n_edges
+
+    # --- building ---
+
+    def __node(self, node_id:str) -> int:
+        index = self.__index.get(node_id)
+        if index is not None:
+            return index
+        index = len(self.__ids)
+        if self.__node_capacity <= index:
+            self.__node_capacity *= 2
+            for name, column in self.__columns.items():
+                if isinstance(column, np.ndarray):
+                    self.__columns[name] = self.__grow(column, self.__node_capacity)
+        self.__index[node_id] = index
+        self.__ids.append(node_id)
+        for column in self.__columns.values():
+            if isinstance(column, list):
+                column.append('')
+        return index
+
+    @staticmethod
+    def __grow(array:np.ndarray, size:int) -> np.ndarray:
+        grown = np.zeros(size, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def add_node(self, node_id:str, **attrs):
+        '''add a node or update its attributes'''
+        index = self.__node(node_id)
+        for name, value in attrs.items():
+            column = self.__columns.get(name)
+            if column is None:
+                column = self.__new_column(value)
+                self.__columns[name] = column
+            column[index] = value
+
+    def __new_column(self, value:Any) -> Union[np.ndarray, list]:
+        if isinstance(value, (bool, np.bool_)):
+            return np.zeros(self.__node_capacity, dtype=np.bool_)
+        if isinstance(value, (int, np.integer)):
+            return np.zeros(self.__node_capacity, dtype=np.int64)
+        if isinstance(value, (float, np.floating)):
+            return np.zeros(self.__node_capacity, dtype=np.float64)
+        return [''] * len(self.__ids)
+
+    def add_edge(self, src:str, dst:str):
+        u, v = self.__node(src), self.__node(dst)
+        if len(self.__src) <= self.__n_edges:
+            self.__src = self.__grow(self.__src, len(self.__src) * 2)
+            self.__dst = self.__grow(self.__dst, len(self.__dst) * 2)
+        self.__src[self.__n_edges] = u
+        self.__dst[self.__n_edges] = v
+        self.__n_edges += 1
+        self.__csr, self.__csc = None, None
+
+    def add_edges(self, src:np.ndarray, dst:np.ndarray):
+        '''add edges between the node indices (vectorized)'''
+        n = len(src)
+        size = len(self.__src)
+        while size < self.__n_edges + n:
+            size *= 2
+        if len(self.__src) < size:
+            self.__src, self.__dst = self.__grow(self.__src, size), self.__grow(self.__dst, size)
+        self.__src[self.__n_edges:self.__n_edges + n] = src
+        self.__dst[self.__n_edges:self.__n_edges + n] = dst
+        self.__n_edges += n
+        self.__csr, self.__csc = None, None
+
+    def __compact(self):
+        '''sort the edges by (src, dst) and drop the duplicated ones'''
+        if self.__n_compacted == self.__n_edges:
+            return
+        src, dst = self.__src[:self.__n_edges], self.__dst[:self.__n_edges]
+        order = np.lexsort((dst, src))
+        src, dst = src[order], dst[order]
+        keep = np.ones(len(src), dtype=np.bool_)
+        keep[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        n = int(keep.sum())
+        self.__src[:n], self.__dst[:n] = src[keep], dst[keep]
+        self.__n_edges = self.__n_compacted = n
+
+    # --- adjacency ---
+
+    @property
+    def csr(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''(indptr, indices) of the out-edges: successors of node i are indices[indptr[i]:indptr[i + 1]]'''
+        if self.__csr is None:
+            self.__compact()
+            src, dst = self.__src[:self.__n_edges], self.__dst[:self.__n_edges]
+            self.__csr = (self.__indptr(src), dst.copy())
+        return self.__csr
+
+    @property
+    def csc(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''(indptr, indices) of the in-edges: predecessors of node i are indices[indptr[i]:indptr[i + 1]]'''
+        if self.__csc is None:
+            self.__compact()
+            src, dst = self.__src[:self.__n_edges], self.__dst[:self.__n_edges]
+            order = np.lexsort((src, dst))
+            self.__csc = (self.__indptr(dst), src[order])
+        return self.__csc
+
+    def __indptr(self, rows:np.ndarray) -> np.ndarray:
+        indptr = np.zeros(len(self.__ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self.__ids)), out=indptr[1:])
+        return indptr
+
+    def edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''(src, dst) node indices of the edges sorted by (src, dst)'''
+        self.__compact()
+        return self.__src[:self.__n_edges].copy(), self.__dst[:self.__n_edges].copy()
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.csr[0])
+
+    def in_degree(self) -> np.ndarray:
+        return np.diff(self.csc[0])
+
+    def successors(self, node_id:str) -> List[str]:
+        indptr, indices = self.csr
+        i = self.__index[node_id]
+        return [self.__ids[j] for j in indices[indptr[i]:indptr[i + 1]]]
+
+    def predecessors(self, node_id:str) -> List[str]:
+        indptr, indices = self.csc
+        i = self.__index[node_id]
+        return [self.__ids[j] for j in indices[indptr[i]:indptr[i + 1]]]
+
+    def has_edge(self, src:str, dst:str) -> bool:
+        if src not in self.__index or dst not in self.__index:
+            return False
+        indptr, indices = self.csr
+        i = self.__index[src]
+        row = indices[indptr[i]:indptr[i + 1]]
+        k = np.searchsorted(row, self.__index[dst])
+        return k < len(row) and row[k] == self.__index[dst]
+
+    # --- attributes ---
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.__columns.keys())
+
+    def column(self, name:str) -> Union[np.ndarray, list]:
+        '''values of a node attribute in the order of the node indices'''
+        column = self.__columns[name]
+        return column[:len(self.__ids)]
+
+    def node_attrs(self, node_id:str) -> Dict[str, Any]:
+        index = self.__index[node_id]
+        return {name: column[index].item() if isinstance(column, np.ndarray) else column[index]
+                for name, column in self.__columns.items()}
+
+    # --- export ---
+
+    def to_networkx(self) -> nx.DiGraph:
+        graph = nx.DiGraph()
+        graph.add_nodes_from((node_id, self.node_attrs(node_id)) for node_id in self.__ids)
+        src, dst = self.edges()
+        graph.add_edges_from((self.__ids[u], self.__ids[v]) for u, v in zip(src.tolist(), dst.tolist()))
+        return graph
+
+    @staticmethod
+    def from_networkx(graph:nx.DiGraph) -> 'CSRGraph':
+        csr_graph = CSRGraph(capacity=max(graph.number_of_nodes(), graph.number_of_edges()))
+        for node_id, attrs in graph.nodes(data=True):
+            csr_graph.add_node(node_id, **attrs)
+        for src, dst in graph.edges():
+            csr_graph.add_edge(src, dst)
+        return csr_graph
+
+    def write_graphml(self, outfile:StrOrPath, block_size:int=4096):
+        '''write the graph as GraphML (equivalent to nx.write_graphml_lxml with named_key_ids=True)
+
+        The nodes and edges are streamed from the columns and the edge arrays `block_size` at a time,
+        so no networkx graph is built. Missing (None) attribute values are left out.
+        The document holds the same keys, nodes and edges as the networkx one, but the edges are
+        written sorted by source and target instead of in insertion order, so the files are not byte-identical.
+        '''
+        types = {name: self.__graphml_type(column) for name, column in self.__columns.items()}
+        src, dst = self.edges()
+        with open(outfile, 'w', encoding='utf-8') as f:
+            f.write(self.GRAPHML_HEADER)
+            # keys in the reverse order of the columns, as networkx writes them
+            f.write(''.join(f'<key id={self.__attr(name)} for="node" attr.name={self.__attr(name)} attr.type="{attr_type}"/>\n'
+                            for name, attr_type in reversed(list(types.items()))))
+            f.write('<graph edgedefault="directed">')
+            for start in range(0, len(self.__ids), block_size):
+                end = min(start + block_size, len(self.__ids))
+                values = {name: self.__to_list(column[start:end]) for name, column in self.__columns.items()}
+                lines = []
+                for i, node_id in enumerate(self.__ids[start:end]):
+                    lines.append(f'<node id={self.__attr(node_id)}>\n')
+                    for name, column in values.items():
+                        if column[i] is not None:
+                            lines.append(f'  <data key={self.__attr(name)}>{escape(str(column[i]))}</data>\n')
+                    lines.append('</node>\n')
+                f.write(''.join(lines))
+            for start in range(0, len(src), block_size):
+                f.write(''.join(f'<edge source={self.__attr(self.__ids[u])} target={self.__attr(self.__ids[v])}/>\n'
+                                for u, v in zip(src[start:start + block_size].tolist(), dst[start:start + block_size].tolist())))
+            f.write('</graph></graphml>')
+
+    @staticmethod
+    def __attr(value:str) -> str:
+        return f'"{escape(value, {chr(34): "&quot;"})}"'
+
+    @staticmethod
+    def __to_list(column:Union[np.ndarray, list]) -> list:
+        return column.tolist() if isinstance(column, np.ndarray) else column
+
+    def __graphml_type(self, column:Union[np.ndarray, list]) -> str:
+        if isinstance(column, np.ndarray):
+            return {np.bool_: 'boolean', np.int64: 'long', np.float64: 'double'}[column.dtype.type]
+        # list columns: the type of their values if they all have the same one
+        kinds = {type(value) for value in column[:len(self.__ids)] if value is not None}
+        kind = kinds.pop() if len(kinds) == 1 else str
+        return {bool: 'boolean', int: 'long', float: 'double'}.get(kind, 'string')
+
+    def iter_edges(self) -> Iterator[Tuple[str, str]]:
+        src, dst = self.edges()
+        for u, v in zip(src.tolist(), dst.tolist()):
+            yield self.__ids[u], self.__ids[v]
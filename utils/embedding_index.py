@@ -0,0 +1,213 @@
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from pathlib import Path
+from tqdm import tqdm
+import json
+import numpy as np
+
+from utils.store import PaperStore
+from utils.utils import StrOrPath
+
+Neighbours = List[Tuple[str, float]]
+
+class EmbeddingIndex(object):
+    '''nearest-neighbour search over the embeddings of the cached papers
+
+    The index is a directory holding a memory-mapped float32 matrix of the L2-normalized embeddings
+    (`vectors.f32`, one row per paper), the paper ids of the rows (`ids.txt`) and `meta.json`.
+    Searches scan the matrix in batches with NumPy (exact cosine similarity);
+    `build_ivf` adds an inverted-file index (k-means lists) which only scans the `n_probe` closest lists.
+
+    Args:
+        root (StrOrPath): directory of the index
+    '''
+    VECTORS:str = 'vectors.f32'
+    IDS:str = 'ids.txt'
+    META:str = 'meta.json'
+    IVF:str = 'ivf.npz'
+
+    def __init__(self, root:StrOrPath):
+        self.__root = Path(root)
+        meta = json.loads((self.__root / self.META).read_text(encoding='utf-8'))
+        self.__dim:int = meta['dim']
+        self.__model:str = meta.get('model', '')
+        with open(self.__root / self.IDS, encoding='utf-8') as f:
+            self.__ids:List[str] = [line.rstrip('\n') for line in f]
+        self.__rows:Optional[Dict[str, int]] = None
+        self.__vectors = np.memmap(self.__root / self.VECTORS, dtype=np.float32, mode='r', shape=(len(self.__ids), self.__dim)) \
+            if 0 < len(self.__ids) else np.zeros((0, self.__dim), dtype=np.float32)
+        self.__ivf:Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        if (self.__root / self.IVF).exists():
+            ivf = np.load(self.__root / self.IVF)
+            self.__ivf = (ivf['centroids'], ivf['order'], ivf['offsets'])
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def __contains__(self, paper_id:str) -> bool:
+        return paper_id in self.rows
+
+    @property
+    def dim(self) -> int:
+        return self.__dim
+
+    @property
+    def model(self) -> str:
+        return self.__model
+
+    @property
+    def rows(self) -> Dict[str, int]:
+        '''paper id -> row of the matrix'''
+        if self.__rows is None:
+            self.__rows = {paper_id: row for row, paper_id in enumerate(self.__ids)}
+        return self.__rows
+
+    @property
+    def has_ivf(self) -> bool:
+        return self.__ivf is not None
+
+    def vector(self, paper_id:str) -> np.ndarray:
+        return np.asarray(self.__vectors[self.rows[paper_id]])
+
+    @staticmethod
+    def build(store:PaperStore, root:StrOrPath, batch_size:int=10000) -> 'EmbeddingIndex':
+        '''write the index of the embeddings in a store (papers without embedding are skipped)
+
+        Args:
+            store (PaperStore): store of the papers
+            root (StrOrPath): directory of the index
+            batch_size (int): number of vectors written at once
+        '''
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        dim, model, count = 0, '', 0
+        batch:List[np.ndarray] = []
+        with open(root / EmbeddingIndex.VECTORS, 'wb') as vectors, open(root / EmbeddingIndex.IDS, 'w', encoding='utf-8') as ids:
+            for paper_id in tqdm(store, total=len(store), desc='indexing embeddings', leave=False):
+                try:
+                    paper = store.get(paper_id)
+                except Exception as ex:
+                    print(f'Warning: {ex} @{paper_id}')
+                    continue
+                if paper is None or len(paper.embedding) == 0:
+                    continue
+                if dim == 0:
+                    dim, model = len(paper.embedding), paper.embed_model
+                if len(paper.embedding) != dim:
+                    print(f'Warning: embedding of {len(paper.embedding)} dims (expected {dim}) @{paper_id}')
+                    continue
+                batch.append(paper.embedding)
+                ids.write(f'{paper.paper_id}\n')
+                count += 1
+                if batch_size <= len(batch):
+                    vectors.write(EmbeddingIndex.__normalize(np.stack(batch)).tobytes())
+                    batch = []
+            if 0 < len(batch):
+                vectors.write(EmbeddingIndex.__normalize(np.stack(batch)).tobytes())
+
+        (root / EmbeddingIndex.META).write_text(json.dumps({'dim': dim, 'count': count, 'model': model}), encoding='utf-8')
+        (root / EmbeddingIndex.IVF).unlink(missing_ok=True)
+        print(f'Indexed embeddings: {count}')
+        return EmbeddingIndex(root)
+
+    @staticmethod
+    def __normalize(vectors:np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1.0e-12)
+
+    def build_ivf(self, n_lists:int=0, n_iter:int=10, sample_size:int=100000, batch_size:int=65536, seed:int=0):
+        '''cluster the vectors with spherical k-means into `n_lists` inverted lists (sqrt(n) if 0)'''
+        n = len(self)
+        n_lists = min(n_lists if 0 < n_lists else max(int(np.sqrt(n)), 1), n)
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(self.__vectors[np.sort(rng.choice(n, size=min(sample_size, n), replace=False))])
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)]
+        for _ in tqdm(range(n_iter), desc='k-means', leave=False):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(assign, kind='stable')
+            counts = np.bincount(assign, minlength=n_lists)
+            empty = counts == 0
+            sums = np.zeros_like(centroids)
+            sums[~empty] = np.add.reduceat(sample[order], np.cumsum(counts)[~empty] - counts[~empty], axis=0)
+            # an empty list takes a random vector
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = self.__normalize(sums)
+
+        assign = np.concatenate([
+            np.argmax(np.asarray(self.__vectors[offset:offset + batch_size]) @ centroids.T, axis=1)
+            for offset in range(0, n, batch_size)
+        ])
+        order = np.argsort(assign, kind='stable').astype(np.int64)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=offsets[1:])
+        np.savez(self.__root / self.IVF, centroids=centroids, order=order, offsets=offsets)
+        self.__ivf = (centroids, order, offsets)
+
+    def search_by_vector(self, vector:np.ndarray, k:int=10, n_probe:int=0, batch_size:int=65536) -> Union[Neighbours, List[Neighbours]]:
+        '''papers with the most similar embeddings (cosine similarity)
+
+        Args:
+            vector (np.ndarray): a query vector (dim,) or a batch of them (n, dim)
+            k (int): number of the papers returned per query
+            n_probe (int): number of the inverted lists scanned if the IVF index is built (0: exact search)
+            batch_size (int): number of rows scanned at once
+        Returns:
+            Union[Neighbours, List[Neighbours]]: (paper_id, similarity) sorted by the similarity, per query for a batch
+        '''
+        queries = self.__normalize(np.atleast_2d(vector))
+        if 0 < n_probe and self.__ivf is not None:
+            results = [self.__search_ivf(query, k, n_probe) for query in queries]
+        else:
+            results = self.__search_rows(queries, None, k, batch_size)
+        return results if np.ndim(vector) == 2 else results[0]
+
+    def __search_rows(self, queries:np.ndarray, rows:Optional[np.ndarray], k:int, batch_size:int) -> List[Neighbours]:
+        '''exact top-k over all the rows or the given ones'''
+        n = len(self) if rows is None else len(rows)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for offset in range(0, n, batch_size):
+            if rows is None:
+                batch_rows = np.arange(offset, min(offset + batch_size, n))
+                vectors = np.asarray(self.__vectors[offset:offset + batch_size])
+            else:
+                batch_rows = rows[offset:offset + batch_size]
+                vectors = np.asarray(self.__vectors[batch_rows])
+            scores = np.concatenate([best_scores, queries @ vectors.T], axis=1)
+            candidates = np.concatenate([best_rows, np.broadcast_to(batch_rows, (len(queries), len(batch_rows)))], axis=1)
+            if k < scores.shape[1]:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores, candidates = np.take_along_axis(scores, top, axis=1), np.take_along_axis(candidates, top, axis=1)
+            best_scores, best_rows = scores, candidates
+
+        results = []
+        for scores, rows_ in zip(best_scores, best_rows):
+            order = np.argsort(-scores, kind='stable')
+            results.append([(self.__ids[row], float(score)) for row, score in zip(rows_[order], scores[order])])
+        return results
+
+    def __search_ivf(self, query:np.ndarray, k:int, n_probe:int) -> Neighbours:
+        centroids, order, offsets = self.__ivf
+        lists = np.argsort(-(centroids @ query))[:n_probe]
+        rows = np.sort(np.concatenate([order[offsets[i]:offsets[i + 1]] for i in lists]))
+        return self.__search_rows(query[None, :], rows, k, len(rows) + 1)[0]
+
+    def similar_papers(self, paper_id:str, k:int=10, n_probe:int=0) -> Neighbours:
+        '''papers whose embeddings are the most similar to the one of a paper (the paper itself excluded)'''
+        neighbours = self.search_by_vector(self.vector(paper_id), k=k + 1, n_probe=n_probe)
+        return [(other_id, score) for other_id, score in neighbours if other_id != paper_id][:k]
+
+    @staticmethod
+    def write(root:StrOrPath, ids:Iterable[str], vectors:np.ndarray, model:str='') -> 'EmbeddingIndex':
+        '''write an index from an array of vectors (e.g. exported from another source)'''
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        ids = list(ids)
+        vectors = EmbeddingIndex.__normalize(vectors)
+        with open(root / EmbeddingIndex.VECTORS, 'wb') as f:
+            for offset in range(0, len(vectors), 65536):
+                f.write(vectors[offset:offset + 65536].tobytes())
+        (root / EmbeddingIndex.IDS).write_text(''.join(f'{paper_id}\n' for paper_id in ids), encoding='utf-8')
+        (root / EmbeddingIndex.META).write_text(json.dumps({'dim': vectors.shape[1], 'count': len(ids), 'model': model}), encoding='utf-8')
+        (root / EmbeddingIndex.IVF).unlink(missing_ok=True)
+        return EmbeddingIndex(root)
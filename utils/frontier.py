@@ -0,0 +1,80 @@
+from typing import Any, Callable, Dict, Tuple, Union
+from collections import deque
+import heapq
+import itertools
+import numpy as np
+
+from utils.common import Paper
+
+# score of a paper to crawl: (paper, root paper) -> float (higher first)
+Score = Callable[[Paper, Paper], float]
+
+def influential_citations(paper:Paper, root:Paper) -> float:
+    '''papers with more influential citations first'''
+    return float(paper.influential_citation_count)
+
+def recency(paper:Paper, root:Paper) -> float:
+    '''newer papers first'''
+    return float(paper.year)
+
+def similarity(paper:Paper, root:Paper) -> float:
+    '''papers whose embedding is closer to the one of the root first (cosine similarity)'''
+    if len(paper.embedding) == 0 or len(paper.embedding) != len(root.embedding):
+        return -1.0
+    norm = float(np.linalg.norm(paper.embedding) * np.linalg.norm(root.embedding))
+    return float(np.dot(paper.embedding, root.embedding)) / norm if 0.0 < norm else -1.0
+
+SCORES:Dict[str, Score] = {
+    'influential_citations': influential_citations,
+    'recency': recency,
+    'similarity': similarity,
+}
+
+def get_score(score:Union[str, Score]) -> Score:
+    if callable(score):
+        return score
+    if score not in SCORES:
+        raise ValueError(f'unknown score: {score} (available: {", ".join(SCORES.keys())})')
+    return SCORES[score]
+
+class Frontier(object):
+    '''frontier of a crawl: FIFO (breadth-first) or max-priority queue (best-first)
+
+    Both push and pop are O(1) for FIFO and O(log n) for the priority queue;
+    items of the same priority are popped in the order they were pushed.
+
+    Args:
+        best_first (bool): pop the item of the highest priority first instead of the oldest one
+    '''
+
+    def __init__(self, best_first:bool=False):
+        self.__best_first = best_first
+        self.__fifo:deque = deque()
+        self.__heap:list = []
+        self.__seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.__heap) if self.__best_first else len(self.__fifo)
+
+    def push(self, item:Any, priority:float=0.0):
+        if self.__best_first:
+            heapq.heappush(self.__heap, (-priority, next(self.__seq), item))
+        else:
+            self.__fifo.append(item)
+
+    def pop(self) -> Any:
+        return self.pop_with_priority()[0]
+
+    def pop_with_priority(self) -> Tuple[Any, float]:
+        '''(item, priority). the priority is 0.0 for FIFO'''
+        if self.__best_first:
+            priority, _, item = heapq.heappop(self.__heap)
+            return item, -priority
+        return self.__fifo.popleft(), 0.0
+
+    def push_front(self, item:Any, priority:float=0.0):
+        '''push an item back ahead of the items of the same priority (e.g. a popped item which was not finished)'''
+        if self.__best_first:
+            heapq.heappush(self.__heap, (-priority, -next(self.__seq), item))
+        else:
+            self.__fifo.appendleft(item)
@@ -0,0 +1,108 @@
+from typing import Any, Dict, Optional, Set, TextIO
+from pathlib import Path
+import json
+import networkx as nx
+
+from utils.utils import StrOrPath
+
+class GraphLog(object):
+    '''append-only log of a directed graph
+
+    The edges are appended to `root/edges.tsv` (`src<TAB>dst` per line) and the attributes of
+    every node to `root/nodes.jsonl` (one JSON object per node, the last one wins).
+    Writing costs O(1) per edge whatever the size of the graph; `compact` turns the log
+    into GraphML (or another format) on demand.
+
+    Args:
+        root (StrOrPath): directory of the log
+    '''
+    EDGES:str = 'edges.tsv'
+    NODES:str = 'nodes.jsonl'
+    FORMATS = ('graphml', 'gexf', 'edgelist')
+
+    def __init__(self, root:StrOrPath):
+        self.__root = Path(root)
+        self.__edges:Optional[TextIO] = None
+        self.__nodes:Optional[TextIO] = None
+        self.__known:Set[str] = set()
+
+    @property
+    def path(self) -> Path:
+        return self.__root
+
+    def reset(self):
+        '''discard the log'''
+        self.close()
+        self.__root.mkdir(parents=True, exist_ok=True)
+        for name in [self.EDGES, self.NODES]:
+            (self.__root / name).write_text('', encoding='utf-8')
+        self.__known = set()
+
+    def __open(self):
+        if self.__edges is None:
+            self.__root.mkdir(parents=True, exist_ok=True)
+            self.__edges = open(self.__root / self.EDGES, 'a', encoding='utf-8')
+            self.__nodes = open(self.__root / self.NODES, 'a', encoding='utf-8')
+
+    def add_node(self, node_id:str, attrs:Dict[str, Any]):
+        '''log the attributes of a node once'''
+        if node_id in self.__known:
+            return
+        self.__open()
+        self.__nodes.write(json.dumps({'id': node_id, **attrs}, ensure_ascii=False) + '\n')
+        self.__known.add(node_id)
+
+    def add_edge(self, src:str, dst:str):
+        self.__open()
+        self.__edges.write(f'{src}\t{dst}\n')
+
+    def flush(self):
+        if self.__edges is not None:
+            self.__edges.flush()
+            self.__nodes.flush()
+
+    def close(self):
+        if self.__edges is not None:
+            self.__edges.close()
+            self.__nodes.close()
+            self.__edges, self.__nodes = None, None
+
+    def load(self, graph:Any=None) -> Any:
+        '''build the graph from the log
+
+        Args:
+            graph (Any): graph to fill (nx.DiGraph or CSRGraph). a new nx.DiGraph if None
+        '''
+        self.flush()
+        graph = graph if graph is not None else nx.DiGraph()
+        nodes = self.__root / self.NODES
+        if nodes.exists():
+            with open(nodes, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip() == '':
+                        continue
+                    attrs = json.loads(line)
+                    graph.add_node(attrs.pop('id'), **attrs)
+        edges = self.__root / self.EDGES
+        if edges.exists():
+            with open(edges, encoding='utf-8') as f:
+                for line in f:
+                    items = line.rstrip('\n').split('\t')
+                    if len(items) == 2:
+                        graph.add_edge(*items)
+        return graph
+
+    def compact(self, outfile:StrOrPath, format:str='graphml') -> Path:
+        '''write the logged graph in `format` (graphml, gexf or edgelist)'''
+        if format not in self.FORMATS:
+            raise ValueError(f'unknown format: {format} (available: {", ".join(self.FORMATS)})')
+        graph = self.load()
+        outfile = Path(outfile)
+        outfile.parent.mkdir(parents=True, exist_ok=True)
+        if format == 'graphml':
+            nx.write_graphml_lxml(graph, str(outfile), encoding='utf-8', prettyprint=True, named_key_ids=True)
+        elif format == 'gexf':
+            nx.write_gexf(graph, str(outfile), encoding='utf-8')
+        else:
+            nx.write_edgelist(graph, str(outfile), delimiter='\t', data=False)
+        return outfile
@@ -0,0 +1,146 @@
+from typing import Deque, Dict, List, Optional, Tuple
+from collections import deque, namedtuple
+from urllib.error import HTTPError
+import urllib.parse
+import http.client
+import threading
+import time
+import gzip
+import zlib
+import io
+
+# connect : seconds spent to open the TCP(+TLS) connection (0.0 if a pooled connection is reused)
+# wait    : seconds from sending the request until the response headers arrive
+# transfer: seconds spent to download and decompress the body
+# raw_bytes / bytes: size of the body on the wire / after decompression
+RequestTiming = namedtuple('RequestTiming', (
+    'method', 'url', 'status', 'reused', 'connect', 'wait', 'transfer', 'total', 'raw_bytes', 'bytes',
+))
+
+class ConnectionPool(object):
+    '''keep-alive HTTP(S) connection pool with gzip/deflate negotiation
+
+    Args:
+        max_idle (int): max number of idle connections kept per host
+        timeout (float): socket timeout in seconds
+        max_timings (int): number of recent RequestTiming records to keep
+    '''
+
+    def __init__(self, max_idle:int=8, timeout:float=5.0, max_timings:int=10000):
+        self.__max_idle = max_idle
+        self.__timeout = timeout
+        self.__idle:Dict[Tuple[str, str], Deque[http.client.HTTPConnection]] = {}
+        self.__lock = threading.Lock()
+        self.__timings:Deque[RequestTiming] = deque(maxlen=max_timings)
+        self.__totals = {
+            'requests': 0, 'reused': 0, 'connect': 0.0, 'wait': 0.0, 'transfer': 0.0, 'raw_bytes': 0, 'bytes': 0,
+        }
+
+    @property
+    def timings(self) -> List[RequestTiming]:
+        '''recent request timings'''
+        with self.__lock:
+            return list(self.__timings)
+
+    @property
+    def stats(self) -> dict:
+        '''accumulated timings of all the requests sent through the pool'''
+        with self.__lock:
+            return dict(self.__totals)
+
+    def __acquire(self, key:Tuple[str, str]) -> http.client.HTTPConnection:
+        with self.__lock:
+            idle = self.__idle.get(key)
+            if idle:
+                return idle.pop()
+        scheme, netloc = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self.__timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.__timeout)
+
+    def __release(self, key:Tuple[str, str], conn:http.client.HTTPConnection):
+        with self.__lock:
+            idle = self.__idle.setdefault(key, deque())
+            if len(idle) < self.__max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def __record(self, timing:RequestTiming):
+        with self.__lock:
+            self.__timings.append(timing)
+            self.__totals['requests'] += 1
+            self.__totals['reused'] += int(timing.reused)
+            for key in ['connect', 'wait', 'transfer', 'raw_bytes', 'bytes']:
+                self.__totals[key] += getattr(timing, key)
+
+    @staticmethod
+    def __decode(data:bytes, encoding:str) -> bytes:
+        encoding = encoding.strip().lower()
+        if encoding == 'gzip':
+            return gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+        if encoding == 'deflate':
+            try:
+                return zlib.decompress(data)
+            except zlib.error:
+                # raw deflate stream without zlib header
+                return zlib.decompress(data, -zlib.MAX_WBITS)
+        return data
+
+    def request(self, method:str, url:str, body:Optional[bytes]=None, headers:Optional[Dict[str, str]]=None) -> bytes:
+        '''send a request over a pooled connection and return the decompressed body
+
+        Raises:
+            HTTPError: if the status code is 400 or above
+        '''
+        parsed = urllib.parse.urlsplit(url)
+        key = (parsed.scheme, parsed.netloc)
+        path = parsed.path + (f'?{parsed.query}' if parsed.query else '')
+        headers = {'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive', **(headers or {})}
+
+        while True:
+            conn = self.__acquire(key)
+            reused = conn.sock is not None
+            start = time.perf_counter()
+            try:
+                if not reused:
+                    conn.connect()
+                connected = time.perf_counter()
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                responded = time.perf_counter()
+                raw = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused:
+                    # the server closed the idle keep-alive connection; retry on a fresh one
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+            data = self.__decode(raw, response.getheader('Content-Encoding', ''))
+            finished = time.perf_counter()
+
+            if response.will_close:
+                conn.close()
+            else:
+                self.__release(key, conn)
+
+            self.__record(RequestTiming(
+                method, url, response.status, reused,
+                connected - start, responded - connected, finished - responded, finished - start,
+                len(raw), len(data),
+            ))
+
+            if 400 <= response.status:
+                raise HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(data))
+            return data
+
+    def close(self):
+        with self.__lock:
+            idle, self.__idle = self.__idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
@@ -0,0 +1,105 @@
+from typing import Dict, List, Optional
+from pathlib import Path
+from collections import namedtuple
+import os
+
+from utils.utils import StrOrPath
+
+# ss_id    : paper id on SemanticScholar
+# merged_at: unix time when the details were fetched and merged
+# updated  : `updated` of the arXiv paper which was merged
+# checked_at: unix time when the arXiv file was last read (merged_at or later)
+LedgerEntry = namedtuple('LedgerEntry', ('ss_id', 'merged_at', 'updated', 'checked_at'))
+
+class MergeLedger(object):
+    '''record of the arXiv papers merged by PaperFinderUtil.merge_arxiv, keyed by the arXiv hash
+
+    The entries are appended to `path` (`hash<TAB>ss_id<TAB>merged_at<TAB>updated<TAB>checked_at` per line, the last one wins)
+    and kept in memory, so a lookup costs no I/O. A line cut by a crash is ignored by the next load.
+
+    Args:
+        path (StrOrPath): path to the ledger file
+    '''
+    FILE:str = 'merge_ledger.tsv'
+
+    def __init__(self, path:StrOrPath):
+        self.__path = Path(path)
+        self.__entries:Dict[str, LedgerEntry] = {}
+        self.__pending:List[str] = []
+        self.__lines = 0
+        if self.__path.is_file():
+            with open(self.__path, encoding='utf-8') as f:
+                for line in f:
+                    self.__lines += 1
+                    items = line.rstrip('\n').split('\t')
+                    # the lines written before checked_at have 4 columns
+                    if len(items) not in [4, 5] or not line.endswith('\n'):
+                        continue
+                    try:
+                        merged_at = float(items[2])
+                        checked_at = float(items[4]) if len(items) == 5 else merged_at
+                        self.__entries[items[0]] = LedgerEntry(items[1], merged_at, items[3], checked_at)
+                    except ValueError:
+                        continue
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __contains__(self, arxiv_hash:str) -> bool:
+        return arxiv_hash in self.__entries
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    def get(self, arxiv_hash:str) -> Optional[LedgerEntry]:
+        return self.__entries.get(arxiv_hash)
+
+    def record(self, arxiv_hash:str, ss_id:str, merged_at:float, updated:str):
+        '''record a merged paper (written to the file by `flush`)'''
+        self.__put(arxiv_hash, LedgerEntry(ss_id, merged_at, self.__normalize(updated), merged_at))
+
+    def touch(self, arxiv_hash:str, checked_at:float):
+        '''record that the arXiv file was read again without being merged (the details keep their merged_at)'''
+        entry = self.__entries.get(arxiv_hash)
+        if entry is not None:
+            self.__put(arxiv_hash, entry._replace(checked_at=checked_at))
+
+    def __put(self, arxiv_hash:str, entry:LedgerEntry):
+        self.__entries[arxiv_hash] = entry
+        self.__pending.append(self.__line(arxiv_hash, entry))
+
+    def is_updated(self, arxiv_hash:str, updated:str) -> bool:
+        '''whether the arXiv paper is not in the ledger or was updated after it was merged'''
+        entry = self.__entries.get(arxiv_hash)
+        return entry is None or entry.updated != self.__normalize(updated)
+
+    @staticmethod
+    def __normalize(updated:str) -> str:
+        return ' '.join(str(updated).split())
+
+    @staticmethod
+    def __line(arxiv_hash:str, entry:LedgerEntry) -> str:
+        # repr of the float, so that merged_at is read back exactly
+        return f'{arxiv_hash}\t{entry.ss_id}\t{entry.merged_at!r}\t{entry.updated}\t{entry.checked_at!r}\n'
+
+    def flush(self):
+        if len(self.__pending) == 0:
+            return
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.__path, 'a', encoding='utf-8') as f:
+            f.writelines(self.__pending)
+        self.__lines += len(self.__pending)
+        self.__pending = []
+        # drop the superseded lines once they are the majority
+        if 2 * len(self.__entries) < self.__lines:
+            self.compact()
+
+    def compact(self):
+        '''rewrite the file with the last entry of each hash'''
+        tmp = self.__path.with_name(f'{self.__path.name}.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.writelines(self.__line(arxiv_hash, entry) for arxiv_hash, entry in self.__entries.items())
+        os.replace(tmp, self.__path)
+        self.__lines = len(self.__entries)
+        self.__pending = []
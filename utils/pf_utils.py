@@ -1,27 +1,94 @@
-from typing import Dict
+from typing import Deque, Dict, Iterator, List, Optional, Set, Tuple, Union
 import sys
 from pathlib import Path
 import time
 import json
 import re
 from tqdm import tqdm
-from glob import glob
+from glob import iglob
 from dateutil.parser import parse as date_parse
-from collections import namedtuple
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
 import networkx as nx
+import numpy as np
 
-from utils.common import Paper
+from utils.common import Paper, RefPaper
 from utils.semanticscholar import SemanticScholar
+from utils.cache import LRUCache, ResponseCache
+from utils.store import PaperStore, DirectoryPaperStore, open_store
+from utils.checkpoint import CrawlCheckpoint
+from utils.graph_log import GraphLog
+from utils.frontier import Frontier, Score, get_score
+from utils.csr_graph import CSRGraph
+from utils.embedding_index import EmbeddingIndex, Neighbours
+from utils.title_index import TitleIndex
+from utils.merge_ledger import LedgerEntry, MergeLedger
 from utils.arxiv import ArXiv
 from utils.utils import StrOrPath, now, timedelta2HMS
 
+Graph = Union[nx.DiGraph, CSRGraph]
+
 class PaperFinderUtil(object):
+    GRAPH_BACKENDS:Dict[str, type] = {'networkx': nx.DiGraph, 'csr': CSRGraph}
 
-    def __init__(self, ss_threshold:float=0.95):
-        self.ss = SemanticScholar(threshold=ss_threshold)
+    def __init__(self, ss_threshold:float=0.95, max_workers:int=4, api_key:str='',
+                 response_cache:StrOrPath='', response_ttl:float=7 * 24 * 3600.0, store:Optional[PaperStore]=None,
+                 paper_cache_size:int=512 * 1024 ** 2, graph_backend:str='networkx'):
+        '''
+        Args:
+            ss_threshold (float): rouge-l threshold to accept a title as the same paper
+            max_workers (int): number of concurrent requests to SemanticScholar
+            api_key (str): SemanticScholar API key
+            response_cache (StrOrPath): path to the SQLite file caching the API responses. no cache if empty
+            response_ttl (float): time to live of the cached responses in seconds
+            store (PaperStore): store of the cached papers. an empty '__cache__/papers' directory store if None
+            paper_cache_size (int): approx. max bytes of the decoded papers kept in memory by get_paper (0: disabled)
+            graph_backend (str): 'networkx' (nx.DiGraph) or 'csr' (CSRGraph, compact arrays for large crawls)
+        '''
+        if graph_backend not in self.GRAPH_BACKENDS:
+            raise ValueError(f'unknown graph backend: {graph_backend} (available: {", ".join(self.GRAPH_BACKENDS.keys())})')
+        cache = ResponseCache(response_cache, ttl=response_ttl) if str(response_cache) != '' else None
+        self.ss = SemanticScholar(threshold=ss_threshold, max_workers=max_workers, api_key=api_key, cache=cache)
         self.axv = ArXiv()
-        self.graph:nx.DiGraph = nx.DiGraph()
-        self.papers:Dict[str, Path] = {}
+        self.__graph_backend = graph_backend
+        self.graph:Graph = self.GRAPH_BACKENDS[graph_backend]()
+        self.graph_log:Optional[GraphLog] = None
+        self.store:PaperStore = store if store is not None else DirectoryPaperStore('__cache__/papers', scan=False)
+        self.__stores:Dict[str, PaperStore] = {self.__store_key(self.store.path): self.store}
+        self.paper_cache = LRUCache(max_items=0, max_size=paper_cache_size, sizeof=self.__sizeof_paper)
+        self.__use_paper_cache = 0 < paper_cache_size
+        # influential citation counts seen by prefilter_papers
+        self.__light_cache = LRUCache(max_items=1000000)
+        self.embedding_index:Optional[EmbeddingIndex] = None
+        # local title -> paper id lookup of get_paper_id (every lookup goes to the API if None)
+        self.title_index:Optional[TitleIndex] = None
+
+    @property
+    def papers(self) -> PaperStore:
+        '''ids of the cached papers'''
+        return self.store
+
+    @staticmethod
+    def __sizeof_paper(paper:Paper) -> int:
+        '''rough estimate of the memory held by a decoded paper'''
+        return 2048 + len(paper.abstract) + 8 * len(paper.embedding) + \
+               200 * (paper.citation_count + paper.reference_count)
+
+    def __remember(self, paper:Paper):
+        # partial papers are not kept, so that the cached papers satisfy any projection
+        if self.__use_paper_cache and paper.paper_id != '' and paper.is_complete:
+            self.paper_cache.put(paper.paper_id, paper)
+
+    @staticmethod
+    def __store_key(path:StrOrPath) -> str:
+        return str(Path(path).resolve().absolute())
+
+    def open_store(self, path:StrOrPath) -> PaperStore:
+        '''open the store at `path`, reusing the already opened ones'''
+        key = self.__store_key(path)
+        if key not in self.__stores:
+            self.__stores[key] = open_store(path, scan=False)
+        return self.__stores[key]
 
     def __show_progress__(self, total:int, done:int, start:float, leave:bool=True,
                           export_papers:bool=False, graph_path:StrOrPath='',
@@ -45,216 +112,732 @@ class PaperFinderUtil(object):
             print(res)
         else:
             print(res, end='')
-    def merge_arxiv(self, arxiv_dir:StrOrPath='__cache__/papers', ss_dir:StrOrPath='__cache__/arxiv'):
-        arxiv_dir:Path = Path(arxiv_dir)
-        ss_dir:Path = Path(ss_dir)
-        arxiv_papers = [Path(f) for f in tqdm(glob(str(arxiv_dir / '**' / '*.json'), recursive=True), desc='load arxiv papers', leave=False)]
+    @staticmethod
+    def __bounded_map(executor:ThreadPoolExecutor, fn, items:Iterator, size:int) -> Iterator:
+        '''run `fn` over `items` in the executor with at most `size` calls in flight, yielding the results in order'''
+        running:Deque[Future] = deque()
+        for item in items:
+            running.append(executor.submit(fn, item))
+            if size <= len(running):
+                yield running.popleft().result()
+        while 0 < len(running):
+            yield running.popleft().result()
 
-        with tqdm(arxiv_papers) as it:
-            for arxiv_paper_path in it:
-                arxiv_paper = json.load(open(arxiv_paper_path))
+    @staticmethod
+    def __batches(items:Iterator, batch_size:int) -> Iterator[list]:
+        batch = []
+        for item in items:
+            batch.append(item)
+            if batch_size <= len(batch):
+                yield batch
+                batch = []
+        if 0 < len(batch):
+            yield batch
+
+    def merge_arxiv(self, arxiv_dir:StrOrPath='__cache__/papers', ss_dir:StrOrPath='__cache__/arxiv', batch_size:int=100, workers:int=8,
+                    ledger:StrOrPath='', max_age:float=0.0):
+        '''merge arXiv papers with the details from SemanticScholar
+
+        The files are streamed through a pipeline: `workers` threads read them and resolve the paper ids,
+        the details of each batch are fetched while the next ones are resolved, and the merged papers
+        are written here in batches. An arXiv file is only rewritten when its ss_id is new.
+
+        The merged papers are recorded in a ledger (MergeLedger) keyed by the arXiv hash, so a re-run only reads
+        the arXiv files modified since they were merged and merges the new or updated papers,
+        plus the papers whose details are older than `max_age` (fetched again from SemanticScholar).
+        A paper merged before the ledger existed (with its ss_id and its merged paper in `ss_dir`) is added to it.
 
-                try:
-                    # 1. get title
-                    if 'ss_id' in arxiv_paper and len(arxiv_paper['ss_id']) > 0:
-                        paper_id = arxiv_paper['ss_id']
+        Args:
+            arxiv_dir (StrOrPath): path to the arXiv papers
+            ss_dir (StrOrPath): path to save the merged papers
+            batch_size (int): number of arXiv papers whose details are fetched at once
+            workers (int): number of threads reading the files and resolving the titles
+            ledger (StrOrPath): path to the merge ledger. `arxiv_dir`/merge_ledger.tsv if empty
+            max_age (float): seconds after which the details of a merged paper are stale (0: never)
+        '''
+        arxiv_dir:Path = Path(arxiv_dir)
+        ss_store = self.open_store(ss_dir)
+        ledger = MergeLedger(arxiv_dir / MergeLedger.FILE if str(ledger) == '' else ledger)
+        stale_before = time.time() - max_age if 0 < max_age else 0.0
+        stats = {'files': 0, 'skipped': 0, 'merged': 0, 'refreshed': 0, 'not_found': 0}
+
+        def is_stale(entry:LedgerEntry) -> bool:
+            return entry.merged_at < stale_before
+
+        def changed(paths:Iterator[Path]) -> Iterator[Path]:
+            '''drop the files read since their last modification (a stat, no read)'''
+            for path in paths:
+                entry = ledger.get(path.stem)
+                if entry is not None and not is_stale(entry) and path.stat().st_mtime <= entry.checked_at:
+                    it.update(1)
+                    stats['files'] += 1
+                    stats['skipped'] += 1
+                    continue
+                yield path
+
+        def resolve(arxiv_paper_path:Path) -> Optional[Tuple[Path, dict, str]]:
+            '''read an arXiv paper and find its paper id (runs in the workers)
+
+            Returns:
+                (path, arXiv paper, status). None if not resolved. status is
+                'new' (ss_id found now), 'known' (ss_id already in the arXiv paper), 'stale' (details to fetch again),
+                'adopt' (merged before the ledger) or 'skip' (merged and not updated)
+            '''
+            try:
+                with open(arxiv_paper_path, encoding='utf-8') as f:
+                    arxiv_paper = json.load(f)
+            except Exception as ex:
+                print(f'Warning: {ex} @{arxiv_paper_path}')
+                return None
+
+            try:
+                entry = ledger.get(arxiv_paper['hash'])
+                if entry is not None:
+                    if is_stale(entry):
+                        arxiv_paper['ss_id'] = entry.ss_id
+                        return arxiv_paper_path, arxiv_paper, 'stale'
+                    if not ledger.is_updated(arxiv_paper['hash'], arxiv_paper['updated']):
+                        return arxiv_paper_path, arxiv_paper, 'skip'
+
+                # 1. get title
+                if 'ss_id' in arxiv_paper and len(arxiv_paper['ss_id']) > 0:
+                    if entry is None and arxiv_paper['ss_id'] in ss_store:
+                        return arxiv_paper_path, arxiv_paper, 'adopt'
+                    return arxiv_paper_path, arxiv_paper, 'known'
+                title = re.sub(r'\$.+\$', '', arxiv_paper['title'], count=100).strip()
+                paper_id = self.get_paper_id(title)
+            except Exception as ex:
+                print(f'Warning: {ex} @{arxiv_paper["title"]}')
+                return None
+
+            if paper_id == '':
+                print(f'Warning: cannot find paper id -> {arxiv_paper["title"]}')
+                return None
+            arxiv_paper['ss_id'] = paper_id
+            return arxiv_paper_path, arxiv_paper, 'new'
+
+        def fetch(records:List[Tuple[Path, dict, str]]) -> Tuple[List[Tuple[Path, dict, str]], Dict[str, Paper]]:
+            '''2. get details of the whole batch at once (the stale ones from SemanticScholar, not from the stores or the response cache)'''
+            stale_ids = [r['ss_id'] for _, r, status in records if status == 'stale']
+            papers = {paper.paper_id: paper for paper in self.get_papers([r['ss_id'] for _, r, status in records if status != 'stale'])}
+            papers.update({paper.paper_id: paper for paper in self.ss.get_paper_details(stale_ids, refresh=True)})
+            return records, papers
+
+        def pending(results:Iterator[Optional[Tuple[Path, dict, str]]]) -> Iterator[Tuple[Path, dict, str]]:
+            for result in results:
+                it.update(1)
+                stats['files'] += 1
+                if result is None:
+                    stats['not_found'] += 1
+                elif result[2] in ['skip', 'adopt']:
+                    stats['skipped'] += 1
+                    # stamped, so that the file is not read again until it is modified
+                    if result[2] == 'adopt':
+                        ledger.record(result[1]['hash'], result[1]['ss_id'], time.time(), result[1]['updated'])
                     else:
-                        title = re.sub(r'\$.+\$', '', arxiv_paper['title'], count=100).strip()
-                        paper_id = self.ss.get_paper_id(title)
-
-                    it.set_description(paper_id)
-
-                    if paper_id == '':
-                        print(f'Warning: cannot find paper id -> {arxiv_paper["title"]}')
-                        json.dump(arxiv_paper, open(arxiv_paper_path, 'w', encoding='utf-8'))
+                        ledger.touch(result[1]['hash'], time.time())
+                else:
+                    yield result
+
+        paths = changed(Path(f) for f in iglob(str(arxiv_dir / '**' / '*.json'), recursive=True))
+        with tqdm(desc='merge arxiv papers') as it, \
+                ThreadPoolExecutor(max_workers=max(workers, 1)) as resolver, ThreadPoolExecutor(max_workers=1) as fetcher:
+            resolved = pending(self.__bounded_map(resolver, resolve, paths, max(workers, 1) * 2))
+            # one batch is fetched while the next one is resolved
+            for records, papers in self.__bounded_map(fetcher, fetch, self.__batches(resolved, batch_size), 2):
+                rewrites, merged = [], []
+                for arxiv_paper_path, arxiv_paper, status in records:
+                    paper_id = arxiv_paper['ss_id']
+                    if paper_id not in papers:
+                        print(f'Warning: No paper found @{arxiv_paper["title"]}')
+                        stats['not_found'] += 1
                         continue
-                    arxiv_paper['ss_id'] = paper_id
-
-                    # 2. get detail
-                    paper:Paper = self.get_paper(paper_id)
 
                     try:
-                        updated = date_parse(arxiv_paper['updated'])
-                    except Exception as ex:
-                        print(f'Warning: {ex} @{paper_id}')
-                        updated = ''
-                
-                    try:
-                        published = date_parse(arxiv_paper['published'])
-                    except Exception as ex:
-                        print(f'Warning: {ex} @{paper_id}')
-                        published = ''
-
-                    kwargs = {
-                        'doi': arxiv_paper['doi'],
-                        'primary_category': arxiv_paper['primary_category'],
-                        'categories': arxiv_paper['categories'],
-                        'updated': updated,
-                        'published': published,
-                        'arxiv_hash': arxiv_paper['hash'],
-                        'arxiv_id': arxiv_paper['id'],
-                        'arxiv_title': arxiv_paper['title'],
-                    }
-                    paper.add_fields(**kwargs)
-
-                    # 3. save paper
-                    self.export_paper(paper, ss_dir)
-                    json.dump(arxiv_paper, open(arxiv_paper_path, 'w', encoding='utf-8'), ensure_ascii=False, indent=2)
+                        paper:Paper = papers[paper_id]
+
+                        try:
+                            updated = date_parse(arxiv_paper['updated'])
+                        except Exception as ex:
+                            print(f'Warning: {ex} @{paper_id}')
+                            updated = ''
                     
-                except Exception as ex:
-                    print(f'Warning: {ex} @{arxiv_paper["title"]}')
-                    continue
+                        try:
+                            published = date_parse(arxiv_paper['published'])
+                        except Exception as ex:
+                            print(f'Warning: {ex} @{paper_id}')
+                            published = ''
+
+                        kwargs = {
+                            'doi': arxiv_paper['doi'],
+                            'primary_category': arxiv_paper['primary_category'],
+                            'categories': arxiv_paper['categories'],
+                            'updated': updated,
+                            'published': published,
+                            'arxiv_hash': arxiv_paper['hash'],
+                            'arxiv_id': arxiv_paper['id'],
+                            'arxiv_title': arxiv_paper['title'],
+                        }
+                        paper.add_fields(**kwargs)
+
+                        # 3. save paper
+                        self.export_paper(paper, ss_dir)
+                        stats['refreshed' if status == 'stale' else 'merged'] += 1
+                        merged.append(arxiv_paper)
+                        if status == 'new':
+                            rewrites.append((arxiv_paper_path, arxiv_paper))
+                        
+                    except Exception as ex:
+                        print(f'Warning: {ex} @{arxiv_paper["title"]}')
+                        continue
+
+                # the merged papers are stored before their ss_id is written back
+                ss_store.flush()
+                for arxiv_paper_path, arxiv_paper in rewrites:
+                    with open(arxiv_paper_path, 'w', encoding='utf-8') as f:
+                        json.dump(arxiv_paper, f, ensure_ascii=False, indent=2)
+                # recorded after the rewrites, so that the files are not newer than their entries
+                merged_at = time.time()
+                for arxiv_paper in merged:
+                    ledger.record(arxiv_paper['hash'], arxiv_paper['ss_id'], merged_at, arxiv_paper['updated'])
+                ledger.flush()
+
+        ledger.flush()
+        self.flush()
+        print(f'arXiv papers: {stats["files"]} | merged: {stats["merged"]} | refreshed: {stats["refreshed"]} '
+              f'| skipped: {stats["skipped"]} | not found: {stats["not_found"]}')
+        if self.title_index is not None:
+            print(self.title_index.report())
 
     def build_reference_graph(self,
             paper_id:str,
             min_influential_citation_count:int=1,
             max_depth:int=3,
-            cache_dir:StrOrPath='__cache__/papers',
+            cache_dir:StrOrPath='',
             graph_dir:StrOrPath='__cache__/graphs',
-            export_interval:int=1000):
+            export_interval:int=1000,
+            checkpoint_interval:int=100,
+            resume:bool=False,
+            workers:int=1,
+            group_size:int=1,
+            max_fanout:int=0,
+            max_reference_depth:int=-1,
+            max_reference_fanout:int=0,
+            score:Union[str, Score, None]=None,
+            max_papers:int=0,
+            max_seconds:float=0.0,
+            prefilter:bool=False):
         '''build a reference graph
-        
+
+        The edges and the nodes are appended to a graph log (`graph_dir/<paper_id>.graphlog`) as they are added
+        and flushed every `export_interval` papers; the GraphML is written once at the end
+        (or on demand with `GraphLog.compact`).
+        The frontier, the visited papers, the edges, the selected and requested ids and the counters are appended
+        to a checkpoint (`graph_dir/<paper_id>.checkpoint.jsonl`) after every `checkpoint_interval` processed papers.
+        With `resume=True` the crawl continues from the last checkpoint: the graph and the frontier are
+        restored from the checkpoint and the store, so the papers crawled before are not requested again.
+        The citations of the next `group_size` papers in the frontier are fetched as one group (the uncached ones by
+        shared /paper/batch requests, light and full with `prefilter`, and the ones an earlier group is still fetching
+        taken from it, so that no paper is requested twice); `workers` groups are fetched concurrently while this thread,
+        the only one touching the graph, the visited set and the frontier, processes the oldest one in the BFS order
+        (the workers also save the fetched papers into the store);
+        so in BFS the graph is the same whatever the number of workers and the group size.
+        With a `score`, the frontier is a priority queue and the best papers are expanded first;
+        combined with `max_papers` and/or `max_seconds` the crawl collects the most relevant subgraph for a fixed cost.
+        The papers popped ahead (up to `workers` groups) do not compete with the neighbours of the papers still
+        being fetched, so the expanded papers may then depend on `workers` and `group_size`
+        (with 1 and 1, the papers are expanded strictly by score).
+        `max_papers` counts every uncached paper requested once (the rejected ones included); when the neighbours of a paper
+        exceed what is left, the ones which fit are fetched and the paper is put back into the frontier at its score
+        with the others, so they are only given up if the budget runs out before its turn comes again.
+        With `max_reference_depth >= 0` the references are followed as well (up to their own depth): the root expands
+        both directions, a paper reached through the citations keeps following the citations and vice versa.
+        The two directions of a paper are fetched in a single batch and, when the fan-out cuts the neighbours,
+        the already crawled or cached papers are kept first.
+
         Args:
             paper_id (str): if of the root paper
             min_influential_citation_count (int): number of citation count. ignore papers with the citation count under the threshold
-            max_depth (int): max depth
-            cache_dir (StrOrPath): path to cache directory
-            export_interval (int): export cache with the specified interval
+            max_depth (int): max depth along the citations
+            cache_dir (StrOrPath): path to the store to save the papers. the store of this instance if empty
+            export_interval (int): flush the graph log with the specified interval
+            checkpoint_interval (int): number of the papers processed between two checkpoints
+            resume (bool): resume the crawl from the checkpoint if any
+            workers (int): number of the groups fetched concurrently
+            group_size (int): number of the frontier papers whose neighbours are fetched together
+            max_fanout (int): max number of the citing papers expanded per paper (0: unlimited)
+            max_reference_depth (int): max depth along the references (-1: the references are not followed)
+            max_reference_fanout (int): max number of the referenced papers expanded per paper (0: unlimited)
+            score (Union[str, Score, None]): crawl best-first by this score ('influential_citations', 'recency',
+                                             'similarity' or a function (paper, root) -> float). breadth-first if None
+            max_papers (int): max number of the uncached papers requested (0: unlimited)
+            max_seconds (float): no request is sent after this many seconds (0: unlimited)
+            prefilter (bool): request only the influential citation count of the uncached neighbours first
+                              and the full details of the ones passing `min_influential_citation_count`
         '''
         TemporaryPaper = namedtuple('TemporaryPaper', (
             'paper_id', 'title', 'year', 'venue', 'citations', 'references',
             'reference_count', 'citation_count', 'influential_citation_count',
             'authors', 'primary_category',
         ))
+        def temporary(paper:Paper) -> TemporaryPaper:
+            return TemporaryPaper(
+                paper.paper_id, paper.title, paper.year, paper.venue,
+                paper.citations, paper.references, paper.reference_count, paper.citation_count,
+                paper.influential_citation_count, paper.authors, paper.primary_category
+            )
+
         sys.setrecursionlimit(10000)
-        self.graph:nx.DiGraph = nx.DiGraph()
+        self.graph = self.GRAPH_BACKENDS[self.__graph_backend]()
         stats = {
             'total': 0,
             'done': 0,
-            'paper_queue': [],
-            'new_papers': [],
-            'finished_papers': [],
-            'cache_dir': Path(cache_dir),
+            'new_papers': 0,
+            'requested': 0,
+            'store': self.store if str(cache_dir) == '' else self.open_store(cache_dir),
             'graph_dir': Path(graph_dir),
         }
-        stats['cache_dir'].mkdir(parents=True, exist_ok=True)
         stats['graph_dir'].mkdir(parents=True, exist_ok=True)
-        graph_cache = stats['graph_dir'] / f'{paper_id}.graphml'
+        self.graph_log = GraphLog(stats['graph_dir'] / f'{paper_id}.graphlog')
+        self.graph_log.reset()
+        checkpoint = CrawlCheckpoint(stats['graph_dir'] / f'{paper_id}.checkpoint.jsonl')
+        header = {'paper_id': paper_id, 'min_influential_citation_count': min_influential_citation_count}
         start = time.time()
 
-        root_paper = self.get_paper(paper_id)
-        stats['paper_queue'].insert(0, (root_paper, 0))
-        stats['total'] += len(root_paper.citations)
-        while 0 < len(stats['paper_queue']):
-
-            paper, depth = stats['paper_queue'].pop()
-
-            if max_depth < depth:
-                while len(stats['paper_queue']) > 0:
-                    paper, _ = stats['paper_queue'].pop()
-                    del paper
-                return
-
-            for ci_ref_paper in paper.citations:
-
-                if ci_ref_paper.paper_id is None:
-                    stats['done'] += 1
-                    continue
-
-                # 1. show progress
-                self.__show_progress__(stats['total'], stats['done'], start, leave=False)
-
-                if len(self.papers) > 0 and len(stats['new_papers']) >= export_interval and len(self.papers) % export_interval == 0:
-                    self.export_graph(graph_cache)
-                    self.__show_progress__(stats['total'], stats['done'], start, graph_path=graph_cache)
-                    stats['new_papers'] = []
-
-                # 2. get paper detail
+        # BFS: O(1) enqueue/dequeue and membership test per edge
+        # an item of the frontier is (paper, depth along the citations, depth along the references),
+        # where None stops the traversal in that direction
+        frontier = Frontier(best_first=score is not None)
+        score_fn = get_score(score) if score is not None else None
+        visited:Set[str] = set()
+        # ids selected by the papers popped so far (submitted to the workers), and the uncached ones requested
+        submitted:Set[str] = set()
+        requested:Set[str] = set()
+        items = checkpoint.load() if resume else None
+        if items is not None and {k: items[0].get(k) for k in header} == header:
+            self.__restore_crawl(items, stats, frontier, visited, submitted, requested, temporary)
+            root_paper = self.get_paper(items[0]['root_id'])
+            print(f'Resumed from {checkpoint.path}: {len(visited)} papers, {len(frontier)} in the frontier')
+        else:
+            if items is not None:
+                print(f'Warning: the checkpoint is for another crawl -> restart @{checkpoint.path}')
+            stats['requested'] += int(not self.is_cached(paper_id))
+            root_paper = self.get_paper(paper_id)
+            # the root paper is stored as well, so that a resumed crawl finds it without a request
+            self.export_paper(root_paper, stats['store'].path)
+            header['root_id'] = root_paper.paper_id
+            checkpoint.start(header)
+            frontier.push((root_paper, 0, 0))
+            visited.add(root_paper.paper_id)
+
+        def select(ref_papers:Tuple[RefPaper, ...], fanout:int) -> List[str]:
+            '''ids of the neighbours to expand: papers which need no request first, cut at the fan-out
+
+            The order only depends on the papers popped before: the store is looked up just for the ids never
+            submitted nor requested by this crawl, which no worker writes (and which a resumed crawl finds
+            as they were), so the selection does not depend on the timing of the workers.
+            '''
+            ids = [ref_paper.paper_id for ref_paper in ref_papers if ref_paper.paper_id is not None]
+            if 0 < fanout < len(ids):
+                ids = sorted(ids, key=lambda i: not (i in visited or i in submitted or
+                                                     (i not in requested and self.is_cached(i))))[:fanout]
+            return ids
+
+        def budget() -> int:
+            '''number of the uncached papers which can still be requested'''
+            if 0 < max_seconds and max_seconds < time.time() - start:
+                return 0
+            if max_papers <= 0:
+                return sys.maxsize
+            return max_papers - stats['requested']
+
+        def fetch(paper_ids:List[str]) -> List[Tuple[Paper, Optional[Exception]]]:
+            '''get and save the neighbours (runs in the workers)'''
+            if prefilter and 0 < min_influential_citation_count:
+                paper_ids = self.prefilter_papers(paper_ids, min_influential_citation_count)
+            results = []
+            for ci_paper in self.get_papers(paper_ids):
                 try:
-                    ci_paper:Paper = self.get_paper(ci_ref_paper.paper_id)
-                    new_paper_path = self.export_paper(ci_paper, cache_dir)
-                    self.papers[ci_paper.paper_id] = new_paper_path
-                    stats['new_papers'].append(ci_paper.paper_id)
-
+                    self.export_paper(ci_paper, stats['store'].path)
+                    results.append((ci_paper, None))
                 except Exception as ex:
-                    print(f'Warning: {ex} @{ci_ref_paper.paper_id}')
+                    results.append((ci_paper, ex))
+            return results
+
+        # the neighbours of the next `group_size` papers are fetched as one group (a single light and a single full
+        # request for all of them) and `workers` groups ahead while the oldest one is processed here
+        executor = ThreadPoolExecutor(max_workers=max(workers, 1))
+        fetching:Deque[Tuple[List[Tuple[Paper, Optional[int], Optional[int], Set[str], Set[str], bool, List[str]]], Future, List[Future]]] = deque()
+        # the fetch of the ids whose group is not processed yet:
+        # a neighbour shared with a paper fetched ahead is taken from that fetch instead of being requested again
+        in_flight:Dict[str, Future] = {}
+        # ids requested since the last record, saved with the next one
+        unrecorded:List[str] = []
+        while True:
+
+            while len(fetching) < max(workers, 1) and 0 < len(frontier) and 0 < budget():
+                group = []
+                while len(group) < max(group_size, 1) and 0 < len(frontier) and 0 < budget():
+                    (paper, depth, ref_depth), priority = frontier.pop_with_priority()
+                    citation_ids = select(paper.citations, max_fanout) \
+                        if depth is not None and depth <= max_depth else []
+                    reference_ids = select(paper.references, max_reference_fanout) \
+                        if ref_depth is not None and ref_depth <= max_reference_depth else []
+                    if len(citation_ids) == 0 and len(reference_ids) == 0:
+                        continue
+
+                    # both directions are fetched by a single batch
+                    paper_ids = list(dict.fromkeys(citation_ids + reference_ids))
+
+                    # the uncached papers beyond the budget are deferred: the paper goes back into the frontier with them
+                    uncached_ids = [i for i in paper_ids if i not in visited and i not in submitted and not self.is_cached(i)]
+                    allowed = budget()
+                    deferred = set(uncached_ids[allowed:])
+                    if 0 < len(deferred):
+                        paper = temporary(paper)
+                        frontier.push_front((paper._replace(
+                            citations=tuple(r for r in paper.citations if r.paper_id in deferred and r.paper_id in citation_ids),
+                            references=tuple(r for r in paper.references if r.paper_id in deferred and r.paper_id in reference_ids),
+                        ), depth, ref_depth), priority)
+                        paper_ids = [i for i in paper_ids if i not in deferred]
+                        citation_ids = [i for i in citation_ids if i not in deferred]
+                        reference_ids = [i for i in reference_ids if i not in deferred]
+                    stats['requested'] += len(uncached_ids) - len(deferred)
+                    charged = [i for i in uncached_ids if i not in deferred]
+                    unrecorded.extend(charged)
+                    requested.update(charged)
+                    submitted.update(paper_ids)
+
+                    stats['total'] += len(paper_ids)
+                    group.append((paper, depth, ref_depth, set(citation_ids), set(reference_ids), 0 < len(deferred), paper_ids))
+                if 0 < len(group):
+                    group_ids = list(dict.fromkeys(i for *_, ids in group for i in ids))
+                    earlier = list(dict.fromkeys(in_flight[i] for i in group_ids if i in in_flight))
+                    group_ids = [i for i in group_ids if i not in in_flight]
+                    future = executor.submit(fetch, group_ids)
+                    in_flight.update((i, future) for i in group_ids)
+                    fetching.append((group, future, earlier))
+
+            if len(fetching) == 0:
+                break
+
+            group, future, earlier = fetching.popleft()
+            results = {}
+            # the earlier groups were processed before (their errors reported then)
+            for other in earlier:
+                if other.exception() is None:
+                    results.update((ci_paper.paper_id, (ci_paper, error)) for ci_paper, error in other.result())
+            try:
+                results.update((ci_paper.paper_id, (ci_paper, error)) for ci_paper, error in future.result())
+            except Exception as ex:
+                print(f'Warning: {ex} @{group[0][0].paper_id}...({len(group)} papers)')
+            for i in [i for i, other in in_flight.items() if other is future]:
+                del in_flight[i]
+
+            for paper, depth, ref_depth, citation_ids, reference_ids, deferred, paper_ids in group:
+                # the papers in the order they were selected, so that the graph does not depend on the grouping
+                ci_papers = [results[i] for i in paper_ids if i in results]
+                fetched = 0
+                record = {'paper_id': paper.paper_id, 'edges': [], 'refs': [], 'push': [], 'deferred': deferred,
+                          'ids': paper_ids, 'requested_ids': unrecorded}
+                unrecorded = []
+
+                for ci_paper, error in ci_papers:
+                    fetched += 1
+
+                    # 1. show progress
+                    self.__show_progress__(stats['total'], stats['done'], start, leave=False)
+
+                    if stats['new_papers'] >= export_interval:
+                        self.graph_log.flush()
+                        self.__show_progress__(stats['total'], stats['done'], start, graph_path=self.graph_log.path)
+                        stats['new_papers'] = 0
+
+                    # 2. paper detail (saved by the worker)
                     stats['done'] += 1
-                    continue
+                    if error is not None:
+                        print(f'Warning: {error} @{ci_paper.paper_id}')
+                        continue
+                    stats['new_papers'] += 1
 
-                # 3. add the new paper into the list
-                stats['done'] += 1
-                if ci_paper.influential_citation_count >= min_influential_citation_count:
-                    self.__add_edge(self.graph, paper, ci_paper)
-                    self.__show_progress__(stats['total'], stats['done'], start, depth=depth, paper=paper, ci_paper=ci_paper)
-
-                    if ci_paper.paper_id not in stats['finished_papers']:
-                        stats['finished_papers'].append(ci_paper.paper_id)
-                        temp_paper = TemporaryPaper(
-                            ci_paper.paper_id, ci_paper.title, ci_paper.year, ci_paper.venue,
-                            ci_paper.citations, ci_paper.references, ci_paper.reference_count, ci_paper.citation_count,
-                            ci_paper.influential_citation_count, ci_paper.authors, ci_paper.primary_category
-                        )
-                        stats['paper_queue'].insert(0, (temp_paper, depth + 1))
-                        stats['total'] += len(ci_paper.citations)
+                    # 3. add the new paper into the frontier
+                    if ci_paper.influential_citation_count < min_influential_citation_count:
+                        continue
+                    next_depth, next_ref_depth = None, None
+                    if ci_paper.paper_id in citation_ids:
+                        # paper <- ci_paper (cited by)
+                        self.__add_edge(self.graph, paper, ci_paper)
+                        record['edges'].append(ci_paper.paper_id)
+                        next_depth = depth + 1
+                    if ci_paper.paper_id in reference_ids:
+                        # ci_paper <- paper (cited by)
+                        self.__add_edge(self.graph, ci_paper, paper)
+                        record['refs'].append(ci_paper.paper_id)
+                        next_ref_depth = ref_depth + 1
+                    self.__show_progress__(stats['total'], stats['done'], start,
+                                           depth=next_depth if next_depth is not None else next_ref_depth, paper=paper, ci_paper=ci_paper)
+
+                    if ci_paper.paper_id not in visited:
+                        visited.add(ci_paper.paper_id)
+                        priority = score_fn(ci_paper, root_paper) if score_fn is not None else 0.0
+                        frontier.push((temporary(ci_paper), next_depth, next_ref_depth), priority)
+                        record['push'].append([ci_paper.paper_id, next_depth, next_ref_depth, priority])
+
+                # papers which could not be fetched
+                stats['done'] += len(citation_ids | reference_ids) - fetched
+
+                # 4. checkpoint (the papers are flushed first, so that the checkpoint never refers to unsaved papers)
+                record.update(total=stats['total'], done=stats['done'], requested=stats['requested'])
+                checkpoint.append(record)
+                if checkpoint_interval <= checkpoint.pending:
+                    stats['store'].flush()
+                    self.graph_log.flush()
+                    checkpoint.flush()
+
+        if 0 < len(frontier):
+            print(f'Budget exhausted: {len(visited)} papers, {len(frontier)} left in the frontier')
 
         # post process
+        executor.shutdown()
+        self.flush()
+        self.graph_log.close()
+        self.graph_log = None
+        checkpoint.flush()
         self.export_graph(stats['graph_dir'] / f'{paper_id}.graphml')
         print('Done.\n')
 
-    def __add_edge(self, graph:nx.DiGraph, src:Paper, dst:Paper):
+    def __restore_crawl(self, items:List[dict], stats:dict, frontier:Frontier, visited:Set[str],
+                        submitted:Set[str], requested:Set[str], temporary):
+        '''replay a checkpoint: rebuild the graph, the frontier and the selected and requested ids from the stored papers'''
+        header, records = items[0], items[1:]
+        pushed:List[Tuple[str, Optional[int], Optional[int], float]] = [(header['root_id'], 0, 0, 0.0)]
+        finished:Set[str] = set()
+        for record in tqdm(records, desc='restoring the crawl', leave=False):
+            paper = self.get_paper(record['paper_id'])
+            for citation_id in record['edges']:
+                self.__add_edge(self.graph, paper, self.get_paper(citation_id))
+            for reference_id in record.get('refs', []):
+                self.__add_edge(self.graph, self.get_paper(reference_id), paper)
+            # [paper_id, depth] before the references were followed, [paper_id, depth, ref_depth] before the scores
+            pushed.extend(item + [None, 0.0][len(item) - 2:] for item in record['push'])
+            # a deferred paper is expanded again (its fetched neighbours are cached)
+            if record.get('deferred', False):
+                finished.discard(record['paper_id'])
+            else:
+                finished.add(record['paper_id'])
+            # the neighbours selected for the paper (only the crawled ones before they were saved)
+            submitted.update(record.get('ids', record['edges'] + record.get('refs', [])))
+            requested.update(record.get('requested_ids', []))
+            stats['total'], stats['done'] = record['total'], record['done']
+            stats['requested'] = record.get('requested', stats['requested'])
+
+        for paper_id, depth, ref_depth, priority in pushed:
+            visited.add(paper_id)
+            if paper_id not in finished:
+                frontier.push((temporary(self.get_paper(paper_id)), depth, ref_depth), priority)
+
+    @staticmethod
+    def __node_attrs(paper:Paper) -> dict:
+        return {
+            'name': paper.paper_id,
+            'paper_id': paper.paper_id,
+            'title': paper.title,
+            'year': paper.year,
+            'venue': paper.venue,
+            'reference_count': paper.reference_count,
+            'citation_count': paper.citation_count,
+            'influential_citation_count': paper.influential_citation_count,
+            'first_author_name': paper.authors[0].name if len(paper.authors) > 0 else '',
+            'first_author_id': paper.authors[0].author_id if len(paper.authors) > 0 else '',
+            'primary_category': paper.primary_category,
+        }
+
+    def __add_edge(self, graph:Graph, src:Paper, dst:Paper):
         graph.add_edge(src.paper_id, dst.paper_id)
-        
+
         for paper in [src, dst]:
             if paper.paper_id is None:
                 continue
-            graph.nodes[paper.paper_id]['name'] = paper.paper_id
-            graph.nodes[paper.paper_id]['paper_id'] = paper.paper_id
-            graph.nodes[paper.paper_id]['title'] = paper.title
-            graph.nodes[paper.paper_id]['year'] = paper.year
-            graph.nodes[paper.paper_id]['venue'] = paper.venue
-            graph.nodes[paper.paper_id]['reference_count'] = paper.reference_count
-            graph.nodes[paper.paper_id]['citation_count'] = paper.citation_count
-            graph.nodes[paper.paper_id]['influential_citation_count'] = paper.influential_citation_count
-            graph.nodes[paper.paper_id]['first_author_name'] = paper.authors[0].name if len(paper.authors) > 0 else ''
-            graph.nodes[paper.paper_id]['first_author_id'] = paper.authors[0].author_id if len(paper.authors) > 0 else ''
-            graph.nodes[paper.paper_id]['primary_category'] = paper.primary_category
-
-    def export_paper(self, paper:Paper, out_dir:StrOrPath='__cache__/papers') -> Path:
-        out_dir:Path = Path(out_dir)
-        out_dir.mkdir(parents=True, exist_ok=True)
-        d1, d2, d3 = paper.paper_id[:3]
-        outfile:Path = out_dir / d1 / d2 / d3 / f'{paper.paper_id}.json'
-        outfile.parent.mkdir(parents=True, exist_ok=True)
-
-        data = paper.to_dict()
-        json.dump(data, open(outfile, 'w', encoding='utf-8'), ensure_ascii=False, indent=2)
-        return outfile
+            attrs = self.__node_attrs(paper)
+            graph.add_node(paper.paper_id, **attrs)
+            if self.graph_log is not None:
+                self.graph_log.add_node(paper.paper_id, attrs)
+
+        if self.graph_log is not None:
+            self.graph_log.add_edge(src.paper_id, dst.paper_id)
+
+    def export_paper(self, paper:Paper, out_dir:StrOrPath='') -> Path:
+        '''save a paper into the store at `out_dir` (the store of this instance if empty)'''
+        store = self.store if str(out_dir) == '' else self.open_store(out_dir)
+        location = store.put(paper)
+        self.__remember(paper)
+        if self.title_index is not None and 'title' in paper.fields and paper.title is not None:
+            self.title_index.add(paper.paper_id, paper.title)
+        return location
 
     def export_graph(self, outfile:StrOrPath='papers.graphml'):
         outfile:Path = Path(outfile)
         outfile = outfile.parent / outfile.stem[0] / outfile.stem[1] / outfile.stem[2] / outfile.name
         outfile.parent.mkdir(parents=True, exist_ok=True)
 
-        nx.write_graphml_lxml(self.graph, str(outfile.resolve().absolute()), encoding='utf-8', prettyprint=True, named_key_ids=True)
+        if isinstance(self.graph, CSRGraph):
+            # streamed from the arrays, without a networkx copy of the graph
+            self.graph.write_graphml(outfile.resolve().absolute())
+        else:
+            nx.write_graphml_lxml(self.graph, str(outfile.resolve().absolute()), encoding='utf-8', prettyprint=True, named_key_ids=True)
+
+    def get_paper(self, paper_id:str, fields:Optional[List[str]]=None) -> Paper:
+        '''get a paper from memory, the stores or SemanticScholar in this order
 
-    def get_paper(self, paper_id:str) -> Paper:
-        if paper_id in self.papers:
-            paper_path = self.papers[paper_id]
-            paper = Paper.from_dict(json.load(open(paper_path)))
+        Args:
+            paper_id (str): id of the paper
+            fields (List[str]): API fields needed (Paper.API_FIELDS). all if None.
+                                a cached paper holding them is returned as is, otherwise only these fields are requested
+                                and the returned partial paper loads the others through this method once they are accessed
+        '''
+        needed = frozenset(Paper.API_FIELDS if fields is None else fields)
+        if self.__use_paper_cache:
+            paper = self.paper_cache.get(paper_id)
+            if paper is not None:
+                return paper
+
+        for store in list(self.__stores.values()):
+            paper = store.get(paper_id)
+            if paper is not None and needed <= paper.fields:
+                self.__remember(paper)
+                return paper
+
+        paper = self.ss.get_paper_detail(paper_id, fields=fields)
+        if paper.is_complete:
+            self.__remember(paper)
         else:
-            paper = self.ss.get_paper_detail(paper_id)
+            paper.set_loader(self.get_paper)
         return paper
 
+    def flush(self):
+        '''write the buffered papers of all the opened stores'''
+        for store in list(self.__stores.values()):
+            store.flush()
+        if self.title_index is not None:
+            self.title_index.flush()
+
+    def is_cached(self, paper_id:str) -> bool:
+        return paper_id in self.paper_cache or any(paper_id in store for store in list(self.__stores.values()))
+
+    def get_paper_id(self, title:str) -> str:
+        '''paper id of a title from the title index, searching SemanticScholar only on a miss ('' if not found)'''
+        if self.title_index is None:
+            return self.ss.get_paper_id(title)
+        return self.title_index.resolve(title, fallback=self.ss.get_paper_id)
+
+    def build_title_index(self, path:StrOrPath='__cache__/titles.tsv') -> TitleIndex:
+        '''index the titles of the papers in the store of this instance for get_paper_id'''
+        self.store.flush()
+        self.title_index = TitleIndex.build(self.store, path, threshold=self.ss.threshold)
+        return self.title_index
+
+    def open_title_index(self, path:StrOrPath='__cache__/titles.tsv') -> TitleIndex:
+        '''open the title index at `path` (the exported papers are added to it)'''
+        self.title_index = TitleIndex(path, threshold=self.ss.threshold)
+        return self.title_index
+
+    def build_embedding_index(self, root:StrOrPath='__cache__/embeddings', ivf_lists:int=-1) -> EmbeddingIndex:
+        '''index the embeddings of the papers in the store of this instance for similar_papers and search_by_vector
+
+        Args:
+            root (StrOrPath): directory of the index
+            ivf_lists (int): number of the inverted lists of the approximate index (0: sqrt(number of papers), -1: none)
+        '''
+        self.store.flush()
+        self.embedding_index = EmbeddingIndex.build(self.store, root)
+        if 0 <= ivf_lists and 0 < len(self.embedding_index):
+            self.embedding_index.build_ivf(n_lists=ivf_lists)
+        return self.embedding_index
+
+    def open_embedding_index(self, root:StrOrPath='__cache__/embeddings') -> EmbeddingIndex:
+        self.embedding_index = EmbeddingIndex(root)
+        return self.embedding_index
+
+    def similar_papers(self, paper_id:str, k:int=10, n_probe:int=0) -> Neighbours:
+        '''papers whose embeddings are the most similar to the one of a paper: (paper_id, cosine similarity)
+
+        The search runs over the embedding index only (no request); a paper missing from the index
+        is searched with its embedding from get_paper.
+
+        Args:
+            paper_id (str): id of the paper
+            k (int): number of the papers returned
+            n_probe (int): number of the inverted lists scanned (0: exact search)
+        '''
+        index = self.__require_embedding_index()
+        if paper_id in index:
+            return index.similar_papers(paper_id, k=k, n_probe=n_probe)
+        neighbours = index.search_by_vector(self.get_paper(paper_id, fields=['embedding']).embedding, k=k + 1, n_probe=n_probe)
+        return [(other_id, score) for other_id, score in neighbours if other_id != paper_id][:k]
+
+    def search_by_vector(self, vector:np.ndarray, k:int=10, n_probe:int=0) -> Neighbours:
+        '''papers whose embeddings are the most similar to a vector: (paper_id, cosine similarity)'''
+        return self.__require_embedding_index().search_by_vector(vector, k=k, n_probe=n_probe)
+
+    def __require_embedding_index(self) -> EmbeddingIndex:
+        if self.embedding_index is None:
+            raise RuntimeError('no embedding index: call build_embedding_index or open_embedding_index first')
+        return self.embedding_index
+
+    def prefilter_papers(self, paper_ids:List[str], min_influential_citation_count:int) -> List[str]:
+        '''drop the uncached papers with fewer influential citations than the threshold
+
+        Only the light fields (SemanticScholar.LIGHT_FIELDS) of the uncached papers are requested,
+        so that the full details are fetched just for the papers passing the filter.
+        The cached papers are kept as they cost no request, and the counts of the rejected papers are remembered
+        so that a paper cited by many others is requested once.
+        '''
+        counts:Dict[str, int] = {}
+        missing_ids = []
+        for paper_id in paper_ids:
+            count = self.__light_cache.get(paper_id)
+            if count is not None:
+                counts[paper_id] = count
+            elif not self.is_cached(paper_id):
+                missing_ids.append(paper_id)
+
+        for paper in self.ss.get_paper_details(missing_ids, fields=self.ss.LIGHT_FIELDS):
+            self.__light_cache.put(paper.paper_id, paper.influential_citation_count)
+            counts[paper.paper_id] = paper.influential_citation_count
+
+        missing = set(missing_ids)
+        return [
+            paper_id for paper_id in paper_ids
+            if counts.get(paper_id, min_influential_citation_count) >= min_influential_citation_count
+            and (paper_id not in missing or paper_id in counts)
+        ]
+
+    def get_papers(self, paper_ids:List[str]) -> Iterator[Paper]:
+        '''get papers from the cache, fetching the missing ones concurrently in batches
+
+        Papers which cannot be fetched are skipped.
+        '''
+        missing_ids = []
+        for paper_id in paper_ids:
+            if self.is_cached(paper_id):
+                try:
+                    yield self.get_paper(paper_id)
+                except Exception as ex:
+                    print(f'Warning: {ex} @{paper_id}')
+            else:
+                missing_ids.append(paper_id)
+
+        for paper in self.ss.get_paper_details(missing_ids):
+            self.__remember(paper)
+            yield paper
+
     @staticmethod
     def from_cache(cache_path:StrOrPath):
-        cache_path:Path = Path(cache_path)
-        
-        pf_util = PaperFinderUtil()
+        '''open the cached papers in a directory or a SQLite store (*.sqlite, *.db)
 
-        print('Reading files from cache...')
-        cache_papers = [Path(f) for f in tqdm(glob(str(cache_path / '**' / '*.json'), recursive=True), leave=False)]
-        for cache_paper in tqdm(cache_papers, desc='Loading...', leave=False):
-            pf_util.papers[cache_paper.stem] = cache_paper
-
-        print(f'Loaded papers: {len(pf_util.papers)}')
+        Papers are resolved on demand, so this does not depend on the size of the cache
+        (except for the first call on a directory cache without manifest).
+        '''
+        pf_util = PaperFinderUtil(store=open_store(cache_path))
+        print(f'Opened paper store: {str(pf_util.store.path.resolve().absolute())}')
         return pf_util
@@ -0,0 +1,52 @@
+import time
+import threading
+
+class TokenBucket(object):
+    '''thread-safe token bucket rate limiter
+
+    Args:
+        rate (float): number of tokens refilled per second
+        capacity (float): max number of tokens the bucket holds (= burst size)
+    '''
+
+    def __init__(self, rate:float, capacity:float=1.0):
+        if rate <= 0.0:
+            raise ValueError(f'rate must be positive: {rate}')
+        self.__rate = rate
+        self.__capacity = max(capacity, 1.0)
+        self.__tokens = self.__capacity
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.__rate
+
+    @property
+    def capacity(self) -> float:
+        return self.__capacity
+
+    def __refill(self):
+        now = time.monotonic()
+        self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updated) * self.__rate)
+        self.__updated = now
+
+    def try_acquire(self, tokens:float=1.0) -> bool:
+        '''take tokens if available without blocking'''
+        with self.__lock:
+            self.__refill()
+            if self.__tokens >= tokens:
+                self.__tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens:float=1.0):
+        '''block until the tokens are available, then take them'''
+        while True:
+            with self.__lock:
+                self.__refill()
+                if self.__tokens >= tokens:
+                    self.__tokens -= tokens
+                    return
+                wait = (tokens - self.__tokens) / self.__rate
+            time.sleep(wait)
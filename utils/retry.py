@@ -0,0 +1,170 @@
+from typing import Any, Callable, Dict, Optional
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.error import URLError, HTTPError
+import http.client
+import random
+import socket
+import threading
+import time
+
+class RetryPolicy(object):
+    '''retry scheduler with exponential backoff, jitter and a circuit breaker
+
+    A policy is meant to be shared by every request to the same API:
+    the circuit breaker opens after `breaker_threshold` consecutive failures and
+    holds all the callers for a cooldown (doubled while the API keeps failing),
+    so an outage slows the requests down instead of hammering the API.
+
+    Errors are classified into:
+        rate_limit: HTTP 429
+        server: HTTP 5xx
+        timeout: socket timeouts, HTTP 408
+        network: connection errors, DNS errors
+        client: other HTTP 4xx (never retried by default)
+        other: anything else
+
+    Args:
+        budgets (Dict[str, int]): max number of retries per error class within a single call
+        base_delay (float): delay of the first retry in seconds
+        max_delay (float): upper bound of the backoff delay in seconds
+        multiplier (float): backoff multiplier
+        jitter (float): ratio of the delay which is randomized (0.0 - 1.0)
+        max_retry_after (float): upper bound of the delay requested by Retry-After
+        breaker_threshold (int): number of consecutive failures which opens the circuit
+        breaker_cooldown (float): first cooldown of the open circuit in seconds
+        max_breaker_cooldown (float): upper bound of the cooldown in seconds
+    '''
+    BUDGETS:Dict[str, int] = {
+        'rate_limit': 10,
+        'server': 6,
+        'timeout': 6,
+        'network': 8,
+        'client': 0,
+        'other': 2,
+    }
+    # error classes which indicate the API itself is in trouble
+    OUTAGE_ERRORS = ('rate_limit', 'server', 'timeout', 'network')
+
+    def __init__(self, budgets:Optional[Dict[str, int]]=None, base_delay:float=1.0, max_delay:float=60.0,
+                 multiplier:float=2.0, jitter:float=0.5, max_retry_after:float=600.0,
+                 breaker_threshold:int=10, breaker_cooldown:float=30.0, max_breaker_cooldown:float=600.0):
+        self.__budgets = {**self.BUDGETS, **(budgets or {})}
+        self.__base_delay = base_delay
+        self.__max_delay = max_delay
+        self.__multiplier = multiplier
+        self.__jitter = min(max(jitter, 0.0), 1.0)
+        self.__max_retry_after = max_retry_after
+        self.__breaker_threshold = breaker_threshold
+        self.__breaker_cooldown = breaker_cooldown
+        self.__max_breaker_cooldown = max_breaker_cooldown
+
+        self.__lock = threading.Lock()
+        self.__failures = 0
+        self.__cooldown = breaker_cooldown
+        self.__open_until = 0.0
+        self.stats = Counter()
+
+    @property
+    def is_open(self) -> bool:
+        '''True while the circuit breaker holds the requests'''
+        return time.monotonic() < self.__open_until
+
+    @staticmethod
+    def classify(ex:Exception) -> str:
+        if isinstance(ex, HTTPError):
+            if ex.code == 429:
+                return 'rate_limit'
+            if ex.code == 408:
+                return 'timeout'
+            if 500 <= ex.code:
+                return 'server'
+            return 'client'
+        if isinstance(ex, (socket.timeout, TimeoutError)):
+            return 'timeout'
+        if isinstance(ex, URLError) and isinstance(ex.reason, (socket.timeout, TimeoutError)):
+            return 'timeout'
+        if isinstance(ex, (URLError, ConnectionError, http.client.HTTPException, OSError)):
+            return 'network'
+        return 'other'
+
+    def __retry_after(self, ex:Exception) -> Optional[float]:
+        if not isinstance(ex, HTTPError) or ex.headers is None:
+            return None
+        value = ex.headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                return None
+        return min(max(seconds, 0.0), self.__max_retry_after)
+
+    def delay(self, ex:Exception, attempt:int) -> float:
+        '''seconds to wait before the `attempt`-th retry'''
+        retry_after = self.__retry_after(ex)
+        if retry_after is not None:
+            return retry_after
+        delay = min(self.__max_delay, self.__base_delay * self.__multiplier ** max(attempt - 1, 0))
+        return delay * (1.0 - self.__jitter * random.random())
+
+    def __wait_for_circuit(self):
+        wait = self.__open_until - time.monotonic()
+        if 0.0 < wait:
+            with self.__lock:
+                self.stats['breaker_wait'] += 1
+            time.sleep(wait)
+
+    def __success(self):
+        with self.__lock:
+            self.__failures = 0
+            self.__cooldown = self.__breaker_cooldown
+
+    def __failure(self, error_class:str):
+        if error_class not in self.OUTAGE_ERRORS:
+            return
+        with self.__lock:
+            self.__failures += 1
+            if self.__failures < self.__breaker_threshold:
+                return
+            self.__failures = 0
+            self.__open_until = time.monotonic() + self.__cooldown
+            self.stats['breaker_open'] += 1
+            print(f'\nCircuit opened for {self.__cooldown:.1f}s after {self.__breaker_threshold} consecutive failures')
+            self.__cooldown = min(self.__cooldown * 2.0, self.__max_breaker_cooldown)
+
+    def call(self, fn:Callable[[], Any], desc:str='') -> Any:
+        '''call `fn` until it succeeds or the retry budget of an error class runs out
+
+        Args:
+            fn (Callable): function to call
+            desc (str): description of the call shown in the retry messages
+        Raises:
+            the last exception once its budget is exhausted
+        '''
+        attempts = Counter()
+        while True:
+            self.__wait_for_circuit()
+            try:
+                result = fn()
+                self.__success()
+                return result
+            except Exception as ex:
+                error_class = self.classify(ex)
+                attempts[error_class] += 1
+                with self.__lock:
+                    self.stats[error_class] += 1
+                self.__failure(error_class)
+
+                if self.__budgets.get(error_class, 0) < attempts[error_class]:
+                    raise
+
+                delay = self.delay(ex, attempts[error_class])
+                msg = f'{str(ex) or type(ex).__name__} -> Retry({error_class}): {attempts[error_class]} in {delay:.1f}s'
+                if sum(attempts.values()) == 1: msg = '\n' + msg
+                print(f'{msg} @{desc}' if desc != '' else msg)
+                time.sleep(delay)
@@ -1,121 +1,266 @@
-from typing import Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
 from attrdict import AttrDict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import json
-import time
-import string
 import re
-from urllib.error import URLError, HTTPError
-import urllib.request
 import urllib.parse
-import socket
-from sumeval.metrics.rouge import RougeCalculator
 import networkx as nx
 
 from utils.common import Paper
+from utils.rate_limiter import TokenBucket
+from utils.http_pool import ConnectionPool
+from utils.retry import RetryPolicy
+from utils.cache import ResponseCache
+from utils.title_matcher import PUNCTUATION, TitleMatcher
 
 class SemanticScholar(object):
+    BASE_URL:str = 'https://api.semanticscholar.org/graph/v1'
     API:Dict[str, str] = {
-        'search_by_title': 'https://api.semanticscholar.org/graph/v1/paper/search?{QUERY}',
-        'search_by_id': 'https://api.semanticscholar.org/graph/v1/paper/{PAPER_ID}?{PARAMS}',
+        'search_by_title': '/paper/search?{QUERY}',
+        'search_by_id': '/paper/{PAPER_ID}?{PARAMS}',
+        'search_by_ids': '/paper/batch?{PARAMS}',
     }
+    FIELDS:List[str] = list(Paper.API_FIELDS)
+    # fields needed to filter the papers of a crawl (a fraction of the payload of FIELDS)
+    LIGHT_FIELDS:List[str] = ['paperId', 'influentialCitationCount']
     CACHE_PATH:Path = Path('__cache__/papers.pickle')
+    # public API quota: 100 requests / 5 minutes
+    RATE_LIMIT:float = 100.0 / 300.0
+    # max number of paper ids per /paper/batch request
+    BATCH_SIZE:int = 500
     
-    def __init__(self, threshold:float=0.95):
-        self.__api = AttrDict(self.API)
-        self.__rouge = RougeCalculator(stopwords=True, stemming=False, word_limit=-1, length_limit=-1, lang="en")
+    def __init__(self, threshold:float=0.95, rate_limit:float=RATE_LIMIT, burst:int=1, max_workers:int=4, api_key:str='',
+                 batch_size:int=BATCH_SIZE, base_url:str=BASE_URL, timeout:float=5.0, retry_policy:Optional[RetryPolicy]=None,
+                 cache:Optional[ResponseCache]=None):
+        '''
+        Args:
+            threshold (float): rouge-l threshold to accept a title as the same paper
+            rate_limit (float): number of requests per second shared by all the workers
+            burst (int): number of requests allowed to be sent at once
+            max_workers (int): number of concurrent requests used by get_paper_details
+            api_key (str): SemanticScholar API key (raises the quota)
+            batch_size (int): number of paper ids per batch request (<= BATCH_SIZE)
+            base_url (str): root of the API (e.g. url of a local stub server)
+            timeout (float): socket timeout in seconds
+            retry_policy (RetryPolicy): retry scheduler shared by all the requests
+            cache (ResponseCache): cache of the API responses. responses are not cached if None
+        '''
+        self.__api = AttrDict({key: base_url.rstrip('/') + path for key, path in self.API.items()})
+        self.__matcher = TitleMatcher(threshold=threshold)
         self.__threshold = threshold
+        self.__limiter = TokenBucket(rate=rate_limit, capacity=burst)
+        self.__max_workers = max(max_workers, 1)
+        self.__batch_size = min(max(batch_size, 1), self.BATCH_SIZE)
+        self.__headers = {'x-api-key': api_key} if api_key != '' else {}
+        self.__http = ConnectionPool(max_idle=self.__max_workers, timeout=timeout)
+        self.__retry = retry_policy if retry_policy is not None else RetryPolicy()
+        self.__cache = cache
 
     @property
     def threshold(self) -> float:
         return self.__threshold
 
-    def __retry_and_wait(self, msg:str, ex:Exception, retry:int) -> int:
-        retry += 1
-        if 5 < retry: raise ex
-        if retry == 1: msg = '\n' + msg
+    @property
+    def max_workers(self) -> int:
+        return self.__max_workers
 
-        print(msg)
+    @property
+    def http(self) -> ConnectionPool:
+        '''pooled connections to the API. `http.stats` and `http.timings` show where the request time goes'''
+        return self.__http
 
-        if ex.errno == -3:
-            time.sleep(300.0)
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return self.__retry
+
+    @property
+    def cache(self) -> Optional[ResponseCache]:
+        return self.__cache
+
+    def __request(self, url:str, data:Optional[dict]=None, use_cache:bool=True, refresh:bool=False) -> dict:
+        '''send a request within the rate limit and return the decoded json
+
+        Args:
+            url (str): request url
+            data (dict): json body. the request is sent as POST if it is given
+            use_cache (bool): look up and store the response in the response cache
+            refresh (bool): send the request even if the response is cached, and overwrite the cached one
+        '''
+        if data is None:
+            method, body, headers = 'GET', None, self.__headers
         else:
-            time.sleep(5.0)
-        return retry
+            method, body, headers = 'POST', json.dumps(data).encode('utf-8'), {**self.__headers, 'Content-Type': 'application/json'}
+
+        use_cache = use_cache and self.__cache is not None
+        key = ResponseCache.key(method, url, data) if use_cache else ''
+        if use_cache and not refresh:
+            response = self.__cache.get(key)
+            if response is not None:
+                return json.loads(response.decode('utf-8'))
+
+        def send() -> Tuple[bytes, dict]:
+            self.__limiter.acquire()
+            response = self.__http.request(method, url, body=body, headers=headers)
+            return response, json.loads(response.decode('utf-8'))
+
+        response, content = self.__retry.call(send, desc=urllib.parse.urlsplit(url).path)
+        if use_cache:
+            self.__cache.put(key, response)
+        return content
+
+    @property
+    def matcher(self) -> TitleMatcher:
+        return self.__matcher
 
     def get_paper_id(self, title:str) -> str:
+        '''id of the first search result whose title is accepted by the rouge-l threshold ('' if none)'''
 
         # remove punctuation
-        title = title
-        for punc in string.punctuation:
-            title = title.replace(punc, ' ')
-        title = re.sub(r'\s\s+', ' ', title, count=1000)
+        title = re.sub(r'\s\s+', ' ', title.translate(PUNCTUATION), count=1000)
 
-        retry = 0
-        while retry < 5:
-            try:
-                params = {
-                    'query': title,
-                    'fields': 'title',
-                    'offset': 0,
-                    'limit': 100,
-                }
-                response = urllib.request.urlopen(self.__api.search_by_title.format(QUERY=urllib.parse.urlencode(params)), timeout=5.0)
-                content = json.loads(response.read().decode('utf-8'))
-                time.sleep(3.5)
-                break
-
-            except HTTPError as ex:
-                retry = self.__retry_and_wait(f'{str(ex)} -> Retry: {retry}', ex, retry)
-            except URLError as ex:
-                retry = self.__retry_and_wait(f'{str(ex)} -> Retry: {retry}', ex, retry)
-            except socket.timeout as ex:
-                retry = self.__retry_and_wait(f'API Timeout -> Retry: {retry}', ex, retry)
-            except Exception as ex:
-                retry = self.__retry_and_wait(f'{str(ex)} -> Retry: {retry}', ex, retry)
-            
-            if 5 <= retry:
-                print(f'No paper-id found @ {title}')
-                return ''
-
-        for item in content['data']:
-            # remove punctuation
-            ref_str = item['title'].lower()
-            for punc in string.punctuation:
-                ref_str = ref_str.replace(punc, ' ')
-            ref_str = re.sub(r'\s\s+', ' ', ref_str, count=1000)
-            
-            score = self.__rouge.rouge_l(summary=title.lower(), references=ref_str)
-            if score > self.threshold:
-                return item['paperId'].strip()
-        return ''
-
-    def get_paper_detail(self, paper_id:str) -> Optional[Paper]:
- 
-        retry = 0
-        while retry < 5:
+        params = {
+            'query': title,
+            'fields': 'title',
+            'offset': 0,
+            'limit': 100,
+        }
+        try:
+            content = self.__request(self.__api.search_by_title.format(QUERY=urllib.parse.urlencode(params)))
+        except Exception:
+            print(f'No paper-id found @ {title}')
+            return ''
+
+        # all the results are scored at once (same decisions as rouge_l on each one)
+        items = content['data']
+        index = self.__matcher.match(title, [item['title'] or '' for item in items])
+        return items[index]['paperId'].strip() if 0 <= index else ''
+
+    def get_paper_detail(self, paper_id:str, fields:Optional[List[str]]=None, refresh:bool=False) -> Optional[Paper]:
+        '''
+        Args:
+            paper_id (str): id of the paper
+            fields (List[str]): fields to request. FIELDS if None.
+                                the other fields of the returned partial paper are fetched when they are accessed
+            refresh (bool): request the paper even if it is in the response cache, and overwrite the cached response
+        '''
+        params = self.__params(fields)
+        content = None if refresh else self.__cached_content(paper_id, params)
+        if content is None:
             try:
-                fields = [
-                    'paperId', 'url', 'title', 'abstract', 'venue', 'year',
-                    'referenceCount', 'citationCount', 'influentialCitationCount', 'isOpenAccess', 'fieldsOfStudy',
-                    'authors', 'citations', 'references', 'embedding'
-                ]
-                params = f'fields={",".join(fields)}'
-                response = urllib.request.urlopen(self.__api.search_by_id.format(PAPER_ID=paper_id, PARAMS=params), timeout=5.0)
-                time.sleep(3.5)
-                break
-
-            except HTTPError as ex:
-                retry = self.__retry_and_wait(f'{str(ex)} -> Retry: {retry}', ex, retry)
-            except URLError as ex:
-                retry = self.__retry_and_wait(f'{str(ex)} -> Retry: {retry}', ex, retry)
-            except socket.timeout as ex:
-                retry = self.__retry_and_wait(f'API Timeout -> Retry: {retry}', ex, retry)
-            except Exception as ex:
-                retry = self.__retry_and_wait(f'{str(ex)} -> Retry: {retry}', ex, retry)
-            
-            if 5 <= retry:
+                content = self.__request(self.__api.search_by_id.format(PAPER_ID=paper_id, PARAMS=params), refresh=refresh)
+            except Exception:
                 raise Exception(f'No paper found @ {paper_id}')
+        return self.__paper(content)
+
+    def __params(self, fields:Optional[List[str]]) -> str:
+        fields = self.FIELDS if fields is None else ['paperId'] + [field for field in fields if field != 'paperId']
+        return f'fields={",".join(fields)}'
+
+    def __paper(self, content:dict) -> Paper:
+        paper = Paper(**content)
+        if not paper.is_complete:
+            paper.set_loader(self.get_paper_detail)
+        return paper
+
+    def __cached_content(self, paper_id:str, params:str) -> Optional[dict]:
+        '''a cached response of /paper/{id} for the fields or for all the fields (which contains them)'''
+        if self.__cache is None:
+            return None
+        for key_params in dict.fromkeys([params, self.__params(None)]):
+            response = self.__cache.get(self.__paper_key(paper_id, key_params))
+            if response is not None:
+                return json.loads(response.decode('utf-8'))
+        return None
+
+    def get_paper_details_batch(self, paper_ids:List[str], fields:Optional[List[str]]=None, refresh:bool=False) -> List[Optional[Paper]]:
+        '''fetch paper details with a single /paper/batch request
+
+        Args:
+            paper_ids (List[str]): ids of the papers (<= batch_size)
+            fields (List[str]): fields to request. FIELDS if None
+            refresh (bool): request all the papers even if they are in the response cache, and overwrite the cached responses
+        Returns:
+            List[Optional[Paper]]: papers in the order of `paper_ids`. None for unknown ids
+        '''
+        if self.__batch_size < len(paper_ids):
+            raise ValueError(f'too many paper ids for a batch request: {len(paper_ids)} > {self.__batch_size}')
+
+        params = self.__params(fields)
+
+        # look up each paper in the cache as if it was requested by /paper/{id}
+        contents:Dict[str, Optional[dict]] = {}
+        for paper_id in [] if refresh else paper_ids:
+            content = self.__cached_content(paper_id, params)
+            if content is not None:
+                contents[paper_id] = content
+
+        missing_ids = [paper_id for paper_id in paper_ids if paper_id not in contents]
+        if 0 < len(missing_ids):
+            try:
+                content = self.__request(self.__api.search_by_ids.format(PARAMS=params), data={'ids': missing_ids}, use_cache=False)
+            except Exception:
+                raise Exception(f'No papers found @ {missing_ids[0]}...({len(missing_ids)} papers)')
+
+            for paper_id, item in zip(missing_ids, content):
+                contents[paper_id] = item
+                if self.__cache is not None and item is not None:
+                    self.__cache.put(self.__paper_key(paper_id, params), json.dumps(item).encode('utf-8'))
+
+        return [self.__paper(contents[paper_id]) if contents.get(paper_id) is not None else None for paper_id in paper_ids]
+
+    def __paper_key(self, paper_id:str, params:str) -> str:
+        return ResponseCache.key('GET', self.__api.search_by_id.format(PAPER_ID=paper_id, PARAMS=params))
+
+    def __get_chunk(self, paper_ids:List[str], fields:Optional[List[str]]=None, refresh:bool=False) -> List[Optional[Paper]]:
+        if len(paper_ids) == 1:
+            return [self.get_paper_detail(paper_ids[0], fields=fields, refresh=refresh)]
+        return self.get_paper_details_batch(paper_ids, fields=fields, refresh=refresh)
+
+    def __chunks(self, paper_ids:Iterable[str]) -> Iterator[List[str]]:
+        chunk = []
+        for paper_id in paper_ids:
+            chunk.append(paper_id)
+            if len(chunk) >= self.__batch_size:
+                yield chunk
+                chunk = []
+        if 0 < len(chunk):
+            yield chunk
+
+    def get_paper_details(self, paper_ids:Iterable[str], fields:Optional[List[str]]=None, refresh:bool=False) -> Iterator[Paper]:
+        '''fetch paper details concurrently
+
+        Paper ids are grouped into /paper/batch requests of up to `batch_size` ids,
+        which are sent by `max_workers` threads sharing the rate limiter,
+        so the throughput is bounded by the API quota.
+        Papers are yielded in the order of `paper_ids`; papers which cannot be fetched are skipped.
+
+        Args:
+            paper_ids (Iterable[str]): ids of the papers
+            fields (List[str]): fields to request. FIELDS if None
+            refresh (bool): request the papers even if they are in the response cache, and overwrite the cached responses
+        '''
+        with ThreadPoolExecutor(max_workers=self.__max_workers) as executor:
+            futures = deque()
+            for chunk in self.__chunks(paper_ids):
+                futures.append((chunk, executor.submit(self.__get_chunk, chunk, fields, refresh)))
+                # keep a bounded number of requests in flight
+                while len(futures) > self.__max_workers * 2:
+                    yield from self.__pop_results(futures)
+            while 0 < len(futures):
+                yield from self.__pop_results(futures)
+
+    def __pop_results(self, futures:deque) -> Iterator[Paper]:
+        paper_ids, future = futures.popleft()
+        try:
+            papers = future.result()
+        except Exception as ex:
+            print(f'Warning: {ex} @{paper_ids[0]}...({len(paper_ids)} papers)')
+            return
 
-        content = json.loads(response.read().decode('utf-8'))
-        return Paper(**content)
+        for paper_id, paper in zip(paper_ids, papers):
+            if paper is None:
+                print(f'Warning: No paper found @ {paper_id}')
+                continue
+            yield paper
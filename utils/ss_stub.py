@@ -0,0 +1,173 @@
+from typing import Dict, Iterable, List
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import gzip
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+class SemanticScholarStub(object):
+    '''local stub of the SemanticScholar Graph API
+
+    Serves `/paper/search`, `/paper/{id}` and `/paper/batch` from an in-memory dict of papers,
+    so that SemanticScholar can be exercised without the network.
+
+    Usage:
+        >>> with SemanticScholarStub(synthetic_papers(1000)) as stub:
+        ...     ss = SemanticScholar(base_url=stub.url, rate_limit=1000.0)
+        ...     papers = list(ss.get_paper_details(['P00000001', 'P00000002']))
+        ...     print(stub.stats)
+
+    Args:
+        papers (Iterable[dict]): papers in the API format (camelCase keys)
+        batch_size (int): max number of ids accepted by /paper/batch
+        compress (bool): gzip the responses if the client accepts it
+        latency (float): seconds added to every response to emulate the remote API
+    '''
+
+    def __init__(self, papers:Iterable[dict], batch_size:int=500, compress:bool=True, latency:float=0.0):
+        self.papers:Dict[str, dict] = {paper['paperId']: paper for paper in papers}
+        self.batch_size = batch_size
+        self.compress = compress
+        self.latency = latency
+        self.stats = {'requests': 0, 'bytes': 0, 'papers': 0}
+        self.__lock = threading.Lock()
+        self.__server = ThreadingHTTPServer(('127.0.0.1', 0), self.__handler())
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def record(self, body:bytes, n_papers:int):
+        '''count a response'''
+        with self.__lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += len(body)
+            self.stats['papers'] += n_papers
+
+    @staticmethod
+    def project(paper:dict, fields:List[str]) -> dict:
+        '''select the requested fields as the API does'''
+        return {'paperId': paper['paperId'], **{field: paper.get(field) for field in fields if field != 'paperId'}}
+
+    def __handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def __send(self, status:int, content, n_papers:int=0):
+                body = json.dumps(content).encode('utf-8')
+                gzipped = stub.compress and 'gzip' in self.headers.get('Accept-Encoding', '')
+                if gzipped:
+                    body = gzip.compress(body)
+                stub.record(body, n_papers)
+                if 0 < stub.latency:
+                    time.sleep(stub.latency)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                if gzipped:
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def __parse(self):
+                url = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(url.query)
+                fields = query.get('fields', ['paperId'])[0].split(',')
+                return url.path, query, fields
+
+            def do_GET(self):
+                path, query, fields = self.__parse()
+                if path.endswith('/paper/search'):
+                    words = query.get('query', [''])[0].lower().split()
+                    limit = int(query.get('limit', ['100'])[0])
+                    hits = [p for p in stub.papers.values() if all(w in p['title'].lower() for w in words)][:limit]
+                    self.__send(200, {'total': len(hits), 'offset': 0, 'data': [stub.project(p, fields) for p in hits]}, len(hits))
+                    return
+
+                paper_id = urllib.parse.unquote(path.rsplit('/', 1)[-1])
+                if paper_id not in stub.papers:
+                    self.__send(404, {'error': 'Paper not found'})
+                    return
+                self.__send(200, stub.project(stub.papers[paper_id], fields), 1)
+
+            def do_POST(self):
+                path, _, fields = self.__parse()
+                if not path.endswith('/paper/batch'):
+                    self.__send(404, {'error': 'Not found'})
+                    return
+
+                length = int(self.headers.get('Content-Length', 0))
+                ids = json.loads(self.rfile.read(length).decode('utf-8')).get('ids', [])
+                if stub.batch_size < len(ids):
+                    self.__send(400, {'error': f'-- too many ids: {len(ids)} > {stub.batch_size}'})
+                    return
+                content = [stub.project(stub.papers[i], fields) if i in stub.papers else None for i in ids]
+                self.__send(200, content, len(ids))
+
+        return Handler
+
+def synthetic_papers(n_papers:int, n_citations:int=10, embedding_dim:int=768, seed:int=0) -> List[dict]:
+    '''generate a random citation graph in the API format
+
+    Paper i is cited only by papers with larger indices, so the graph is a DAG rooted at paper 0.
+
+    Args:
+        n_papers (int): number of papers
+        n_citations (int): average number of citations per paper
+        embedding_dim (int): dimension of the embedding vectors
+        seed (int): random seed
+    '''
+    rng = random.Random(seed)
+    ids = [f'P{i:08d}' for i in range(n_papers)]
+    titles = [f'synthetic paper {i}' for i in range(n_papers)]
+    citations = [[] for _ in range(n_papers)]
+    references = [[] for _ in range(n_papers)]
+    for i in range(1, n_papers):
+        for j in set(rng.randrange(0, i) for _ in range(min(i, max(1, rng.randint(0, 2 * n_citations))))):
+            citations[j].append(i)
+            references[i].append(j)
+
+    papers = []
+    for i in range(n_papers):
+        papers.append({
+            'paperId': ids[i],
+            'url': f'https://www.semanticscholar.org/paper/{ids[i]}',
+            'title': titles[i],
+            'abstract': f'abstract of {titles[i]}',
+            'venue': rng.choice(['ACL', 'NeurIPS', 'ICML', 'arXiv']),
+            'year': 2000 + i * 20 // max(n_papers, 1),
+            'referenceCount': len(references[i]),
+            'citationCount': len(citations[i]),
+            'influentialCitationCount': rng.randint(0, 5),
+            'isOpenAccess': rng.random() < 0.5,
+            'fieldsOfStudy': ['Computer Science'],
+            'authors': [{'authorId': f'A{i:08d}', 'name': f'author {i}'}],
+            'citations': [{'paperId': ids[c], 'title': titles[c]} for c in citations[i]],
+            'references': [{'paperId': ids[r], 'title': titles[r]} for r in references[i]],
+            'embedding': {'model': 'specter@v0.1.1', 'vector': [rng.random() for _ in range(embedding_dim)]},
+        })
+    return papers
@@ -0,0 +1,339 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+from pathlib import Path
+from glob import glob
+from tqdm import tqdm
+import threading
+import sqlite3
+
+from utils.common import Paper
+from utils.codec import PaperCodec, JsonCodec, CODECS, get_codec, decode_paper
+from utils.utils import StrOrPath
+
+class PaperStore(object):
+    '''storage of the cached papers
+
+    A store behaves like a read-only mapping of paper ids (`in`, `len`, iteration)
+    plus `get`/`put` of Paper objects.
+    '''
+
+    def __contains__(self, paper_id:str) -> bool:
+        raise NotImplementedError()
+
+    def __len__(self) -> int:
+        raise NotImplementedError()
+
+    def __iter__(self) -> Iterator[str]:
+        raise NotImplementedError()
+
+    @property
+    def path(self) -> Path:
+        raise NotImplementedError()
+
+    def get(self, paper_id:str) -> Optional[Paper]:
+        '''load a paper. None if the paper is not in the store'''
+        raise NotImplementedError()
+
+    def put(self, paper:Paper) -> Path:
+        '''save a paper and return its location'''
+        raise NotImplementedError()
+
+    def put_many(self, papers:Iterable[Paper]) -> int:
+        '''save papers and return the number of the saved papers'''
+        count = 0
+        for paper in papers:
+            self.put(paper)
+            count += 1
+        return count
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class DirectoryPaperStore(PaperStore):
+    '''one file per paper under `root/d1/d2/d3/<paper_id>.<suffix of the codec>`
+
+    The location of a paper is derived from its id, so lookups only stat a single file
+    and opening the store is constant-time.
+    The ids are listed in an append-only manifest (`root/manifest.txt`) which is updated by `put`,
+    so `len` and iteration never walk the directory tree.
+    Nothing is created on disk before the first `put`.
+
+    Args:
+        root (StrOrPath): root directory of the store
+        scan (bool): if True, build the manifest of a legacy cache without one (walks the directory once)
+        codec (str): format of the files written by `put` ('json' or 'binary').
+                     files written by the other codecs are still readable
+    '''
+    MANIFEST:str = 'manifest.txt'
+
+    def __init__(self, root:StrOrPath='__cache__/papers', scan:bool=True, codec:str='json'):
+        self.__root = Path(root)
+        self.__codec:PaperCodec = get_codec(codec)
+        self.__suffixes = [self.__codec.suffix] + [c.suffix for c in CODECS.values() if c.suffix != self.__codec.suffix]
+        self.__manifest = self.__root / self.MANIFEST
+        self.__known:Set[str] = set()
+        self.__count:Optional[int] = None
+        self.__lock = threading.Lock()
+
+        # a new (or empty) store gets its root and manifest on the first put
+        self.__empty = not self.__manifest.exists() and \
+                       (not self.__root.exists() or not any(p.is_dir() for p in self.__root.iterdir()))
+        if self.__empty:
+            self.__count = 0
+        elif not self.__manifest.exists() and scan:
+            self.build_manifest()
+
+    def __contains__(self, paper_id:str) -> bool:
+        if paper_id in self.__known:
+            return True
+        if self.__find(paper_id) is None:
+            return False
+        self.__known.add(paper_id)
+        return True
+
+    def __len__(self) -> int:
+        if self.__count is None:
+            self.__ensure_manifest()
+            count = 0
+            with open(self.__manifest, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    count += chunk.count(b'\n')
+            self.__count = count
+        return self.__count
+
+    def __iter__(self) -> Iterator[str]:
+        if not self.__ensure_manifest():
+            return
+        with open(self.__manifest, encoding='utf-8') as f:
+            for line in f:
+                paper_id = line.strip()
+                if paper_id != '':
+                    yield paper_id
+
+    @property
+    def path(self) -> Path:
+        return self.__root
+
+    def location(self, paper_id:str, suffix:str='') -> Path:
+        d1, d2, d3 = paper_id[:3]
+        return self.__root / d1 / d2 / d3 / f'{paper_id}{suffix or self.__codec.suffix}'
+
+    def __find(self, paper_id:str) -> Optional[Path]:
+        '''the file of the paper in any format, preferring the format of this store'''
+        if len(paper_id) < 3:
+            return None
+        for suffix in self.__suffixes:
+            path = self.location(paper_id, suffix)
+            if path.is_file():
+                return path
+        return None
+
+    def __ensure_manifest(self) -> bool:
+        '''True if the manifest exists, built if missing (False for an empty store)'''
+        if self.__manifest.exists():
+            return True
+        if self.__empty:
+            return False
+        self.build_manifest()
+        return True
+
+    def build_manifest(self) -> int:
+        '''list the existing papers into the manifest (walks the whole directory)'''
+        print(f'Building the manifest of {self.__root}...')
+        paper_ids = set()
+        for suffix in self.__suffixes:
+            paper_ids.update(Path(f).stem for f in tqdm(glob(str(self.__root / '**' / f'*{suffix}'), recursive=True), leave=False))
+        tmp = self.__manifest.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for paper_id in paper_ids:
+                f.write(f'{paper_id}\n')
+        tmp.replace(self.__manifest)
+        with self.__lock:
+            self.__count = len(paper_ids)
+        return len(paper_ids)
+
+    def get(self, paper_id:str) -> Optional[Paper]:
+        path = self.__find(paper_id)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return decode_paper(f.read())
+
+    def put(self, paper:Paper) -> Path:
+        outfile = self.location(paper.paper_id)
+        current = self.__find(paper.paper_id)
+        is_new = current is None
+        outfile.parent.mkdir(parents=True, exist_ok=True)
+
+        # written aside and renamed, so that concurrent readers never see a partial file
+        tmp = outfile.with_name(f'{outfile.name}.{threading.get_ident()}.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(self.__codec.encode(paper))
+        tmp.replace(outfile)
+        if current is not None and current != outfile:
+            # replace the file written by the other codec
+            current.unlink()
+        with self.__lock:
+            # concurrent puts of a new paper list it only once
+            is_new = is_new and paper.paper_id not in self.__known
+            self.__known.add(paper.paper_id)
+
+        # a cache without manifest gets one listing everything on the next len()/iteration
+        if is_new and (self.__empty or self.__manifest.exists()):
+            with self.__lock:
+                # opened for appending, so created by the first put of an empty store
+                with open(self.__manifest, 'a', encoding='utf-8') as f:
+                    f.write(f'{paper.paper_id}\n')
+                self.__empty = False
+                if self.__count is not None:
+                    self.__count += 1
+        return outfile
+
+class SQLitePaperStore(PaperStore):
+    '''all the papers in a single SQLite file indexed by paper_id
+
+    Writes are buffered and committed in a single transaction every `batch_size` papers.
+
+    Args:
+        path (StrOrPath): path to the SQLite file
+        batch_size (int): number of papers written per transaction
+        codec (str): format of the rows written by `put` ('json' or 'binary').
+                     rows written by the other codecs are still readable
+    '''
+
+    def __init__(self, path:StrOrPath='__cache__/papers.sqlite', batch_size:int=1000, codec:str='json'):
+        self.__path = Path(path)
+        self.__codec:PaperCodec = JsonCodec(indent=None) if codec == 'json' else get_codec(codec)
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        self.__batch_size = batch_size
+        self.__pending:Dict[str, Paper] = {}
+        self.__count:Optional[int] = None
+        self.__lock = threading.RLock()
+        self.__db = sqlite3.connect(str(self.__path), check_same_thread=False, isolation_level=None)
+        self.__db.execute('PRAGMA journal_mode=WAL')
+        self.__db.execute('PRAGMA synchronous=NORMAL')
+        self.__db.execute('CREATE TABLE IF NOT EXISTS papers (paper_id TEXT PRIMARY KEY, data TEXT NOT NULL) WITHOUT ROWID')
+
+    def __contains__(self, paper_id:str) -> bool:
+        with self.__lock:
+            if paper_id in self.__pending:
+                return True
+            return self.__db.execute('SELECT 1 FROM papers WHERE paper_id = ?', (paper_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self.__lock:
+            if self.__count is None:
+                self.flush()
+                self.__count = self.__db.execute('SELECT COUNT(*) FROM papers').fetchone()[0]
+            return self.__count
+
+    def __iter__(self) -> Iterator[str]:
+        with self.__lock:
+            self.flush()
+            ids = [row[0] for row in self.__db.execute('SELECT paper_id FROM papers')]
+        return iter(ids)
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    def get(self, paper_id:str) -> Optional[Paper]:
+        with self.__lock:
+            if paper_id in self.__pending:
+                return self.__pending[paper_id]
+            row = self.__db.execute('SELECT data FROM papers WHERE paper_id = ?', (paper_id,)).fetchone()
+        if row is None:
+            return None
+        return decode_paper(row[0])
+
+    def put(self, paper:Paper) -> Path:
+        with self.__lock:
+            if self.__count is not None and paper.paper_id not in self:
+                self.__count += 1
+            self.__pending[paper.paper_id] = paper
+            if self.__batch_size <= len(self.__pending):
+                self.flush()
+        return self.__path
+
+    def put_many(self, papers:Iterable[Paper]) -> int:
+        count = 0
+        with self.__lock:
+            for paper in papers:
+                self.put(paper)
+                count += 1
+            self.flush()
+        return count
+
+    def __encode(self, paper:Paper):
+        data = self.__codec.encode(paper)
+        # JSON rows are stored as TEXT as they used to be
+        return data.decode('utf-8') if isinstance(self.__codec, JsonCodec) else data
+
+    def flush(self):
+        '''write the buffered papers in a single transaction'''
+        with self.__lock:
+            if len(self.__pending) == 0:
+                return
+            rows = [(paper_id, self.__encode(paper)) for paper_id, paper in self.__pending.items()]
+            self.__db.execute('BEGIN')
+            try:
+                self.__db.executemany('INSERT OR REPLACE INTO papers (paper_id, data) VALUES (?, ?)', rows)
+                self.__db.execute('COMMIT')
+            except Exception:
+                self.__db.execute('ROLLBACK')
+                raise
+            self.__pending = {}
+
+    def close(self):
+        with self.__lock:
+            self.flush()
+            self.__db.close()
+
+SQLITE_SUFFIXES:List[str] = ['.sqlite', '.sqlite3', '.db']
+
+def open_store(path:StrOrPath, scan:bool=True, codec:str='json') -> PaperStore:
+    '''open a store by its path: SQLite for *.sqlite, *.sqlite3 and *.db, otherwise a directory
+
+    Args:
+        path (StrOrPath): path to the store
+        scan (bool): build the manifest of a directory store without one
+        codec (str): format of the papers written into the store ('json' or 'binary')
+    '''
+    path = Path(path)
+    if path.suffix in SQLITE_SUFFIXES:
+        return SQLitePaperStore(path, codec=codec)
+    return DirectoryPaperStore(path, scan=scan, codec=codec)
+
+def migrate_store(src:StrOrPath, dst:StrOrPath, codec:str='json') -> int:
+    '''copy all the papers from a store into another one (e.g. directory -> SQLite, json -> binary)
+
+    Args:
+        src (StrOrPath): path to the source store
+        dst (StrOrPath): path to the destination store
+        codec (str): format of the papers in the destination store
+    Returns:
+        int: number of the migrated papers
+    '''
+    src_store = open_store(src)
+    count = 0
+    with open_store(dst, scan=False, codec=codec) as dst_store:
+        for paper_id in tqdm(src_store, total=len(src_store), desc='migrating papers', leave=False):
+            try:
+                paper = src_store.get(paper_id)
+            except Exception as ex:
+                print(f'Warning: {ex} @{paper_id}')
+                continue
+            if paper is not None:
+                dst_store.put(paper)
+                count += 1
+    src_store.close()
+    print(f'Migrated papers: {count}')
+    return count
@@ -0,0 +1,184 @@
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from pathlib import Path
+from collections import Counter, deque, namedtuple
+from tqdm import tqdm
+import threading
+import time
+
+from utils.store import PaperStore
+from utils.title_matcher import PUNCTUATION, TitleMatcher
+from utils.utils import StrOrPath
+
+# source : 'exact' / 'fuzzy' (found in the index), 'api' (found by the fallback) or 'miss'
+# seconds: time of the lookup including the fallback
+TitleLookup = namedtuple('TitleLookup', ('title', 'paper_id', 'source', 'score', 'seconds'))
+
+def normalize_title(title:str) -> str:
+    '''lowercase the title and replace the punctuation by spaces (as SemanticScholar.get_paper_id)'''
+    return ' '.join(title.lower().translate(PUNCTUATION).split())
+
+class TitleIndex(object):
+    '''offline title -> paper id lookup over the cached papers
+
+    The titles are kept in `path` (`paper_id<TAB>title` per line, appended by `add`).
+    A lookup first tries the normalized title as is, then the titles sharing the rarest words of the query
+    (inverted index), which are accepted by the same ROUGE-L threshold as SemanticScholar.get_paper_id.
+
+    Args:
+        path (StrOrPath): path to the title file. the index is empty if it does not exist
+        threshold (float): rouge-l threshold to accept a title as the same paper
+        max_candidates (int): number of the titles scored by ROUGE-L per fuzzy lookup
+        max_timings (int): number of recent TitleLookup records to keep
+    '''
+    # number of the rarest words of the query whose titles are candidates
+    PROBE_WORDS:int = 3
+
+    def __init__(self, path:StrOrPath='__cache__/titles.tsv', threshold:float=0.95, max_candidates:int=100, max_timings:int=10000):
+        self.__path = Path(path)
+        self.__max_candidates = max_candidates
+        self.__matcher = TitleMatcher(threshold=threshold)
+        self.__lock = threading.Lock()
+        self.__ids:List[str] = []
+        self.__titles:List[str] = []
+        self.__exact:Dict[str, int] = {}
+        self.__postings:Dict[str, List[int]] = {}
+        self.__known:Dict[str, int] = {}
+        self.__pending:List[str] = []
+        self.__timings:Deque[TitleLookup] = deque(maxlen=max_timings)
+        self.__totals = {'lookups': 0, 'exact': 0, 'fuzzy': 0, 'api': 0, 'miss': 0, 'local_seconds': 0.0, 'api_seconds': 0.0}
+        if self.__path.is_file():
+            with open(self.__path, encoding='utf-8') as f:
+                for line in f:
+                    items = line.rstrip('\n').split('\t', 1)
+                    if len(items) == 2:
+                        self.__index(*items)
+
+    def __len__(self) -> int:
+        return len(self.__known)
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    @property
+    def timings(self) -> List[TitleLookup]:
+        '''recent lookups'''
+        with self.__lock:
+            return list(self.__timings)
+
+    @property
+    def stats(self) -> dict:
+        '''number of the lookups by source, hit rate of the index and mean seconds of the local and the fallback lookups'''
+        with self.__lock:
+            stats = dict(self.__totals)
+        local = stats['exact'] + stats['fuzzy']
+        stats['hit_rate'] = local / stats['lookups'] if 0 < stats['lookups'] else 0.0
+        stats['local_ms'] = stats['local_seconds'] / local * 1e3 if 0 < local else 0.0
+        remote = stats['api'] + stats['miss']
+        stats['api_ms'] = stats['api_seconds'] / remote * 1e3 if 0 < remote else 0.0
+        return stats
+
+    def __index(self, paper_id:str, title:str):
+        key = normalize_title(title)
+        if paper_id in self.__known or key == '':
+            return
+        doc = len(self.__ids)
+        self.__ids.append(paper_id)
+        self.__titles.append(key)
+        self.__known[paper_id] = doc
+        self.__exact.setdefault(key, doc)
+        for word in set(key.split()):
+            self.__postings.setdefault(word, []).append(doc)
+
+    def add(self, paper_id:str, title:str):
+        '''index a title (written to the file by `flush`)'''
+        title = ' '.join(title.split())
+        with self.__lock:
+            if paper_id in self.__known:
+                return
+            self.__index(paper_id, title)
+            if paper_id in self.__known:
+                self.__pending.append(f'{paper_id}\t{title}\n')
+
+    def flush(self):
+        with self.__lock:
+            pending, self.__pending = self.__pending, []
+        if 0 < len(pending):
+            self.__path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.__path, 'a', encoding='utf-8') as f:
+                f.writelines(pending)
+
+    @staticmethod
+    def build(store:PaperStore, path:StrOrPath='__cache__/titles.tsv', **kwargs) -> 'TitleIndex':
+        '''index the titles of the papers in a store (the title file is rewritten)'''
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text('', encoding='utf-8')
+        index = TitleIndex(path, **kwargs)
+        for paper_id in tqdm(store, total=len(store), desc='indexing titles', leave=False):
+            try:
+                paper = store.get(paper_id)
+            except Exception as ex:
+                print(f'Warning: {ex} @{paper_id}')
+                continue
+            if paper is not None and 'title' in paper.fields and paper.title is not None:
+                index.add(paper.paper_id, paper.title)
+        index.flush()
+        print(f'Indexed titles: {len(index)}')
+        return index
+
+    def lookup(self, title:str) -> Tuple[str, str, float]:
+        '''find a title in the index
+
+        Returns:
+            Tuple[str, str, float]: (paper_id, 'exact' or 'fuzzy', rouge-l score). ('', 'miss', 0.0) if not found
+        '''
+        key = normalize_title(title)
+        with self.__lock:
+            doc = self.__exact.get(key)
+            if doc is not None:
+                return self.__ids[doc], 'exact', 1.0
+            candidates = self.__candidates(key)
+            titles = [(self.__ids[doc], self.__titles[doc]) for doc in candidates]
+
+        index, score = self.__matcher.best(key, [ref for _, ref in titles])
+        return (titles[index][0], 'fuzzy', score) if 0 <= index else ('', 'miss', 0.0)
+
+    def __candidates(self, key:str) -> List[int]:
+        '''titles sharing the most of the rarest words of the query'''
+        postings = sorted((self.__postings[word] for word in set(key.split()) if word in self.__postings), key=len)
+        counts = Counter()
+        for docs in postings[:self.PROBE_WORDS]:
+            counts.update(docs)
+        return [doc for doc, _ in counts.most_common(self.__max_candidates)]
+
+    def resolve(self, title:str, fallback:Optional[Callable[[str], str]]=None) -> str:
+        '''paper id of a title from the index, or from `fallback` (e.g. SemanticScholar.get_paper_id) on a miss
+
+        Every call is recorded in `timings` and `stats`. '' if the title is not found
+        '''
+        start = time.perf_counter()
+        paper_id, source, score = self.lookup(title)
+        local_sec = time.perf_counter() - start
+        if source == 'miss' and fallback is not None:
+            paper_id = fallback(title)
+            source = 'api' if paper_id != '' else 'miss'
+        total_sec = time.perf_counter() - start
+
+        with self.__lock:
+            self.__timings.append(TitleLookup(title, paper_id, source, score, total_sec))
+            self.__totals['lookups'] += 1
+            self.__totals[source] += 1
+            if source in ['exact', 'fuzzy']:
+                self.__totals['local_seconds'] += local_sec
+            else:
+                self.__totals['api_seconds'] += total_sec
+        return paper_id
+
+    def report(self) -> str:
+        stats = self.stats
+        return (
+            f'title lookups: {stats["lookups"]} | hit rate: {stats["hit_rate"] * 100:.1f}% '
+            f'(exact: {stats["exact"]}, fuzzy: {stats["fuzzy"]}) | api: {stats["api"]} | miss: {stats["miss"]} '
+            f'| local: {stats["local_ms"]:.2f} ms/lookup | api: {stats["api_ms"]:.1f} ms/lookup'
+        )
@@ -0,0 +1,112 @@
+from typing import Dict, List, Sequence, Tuple
+import re
+import string
+import numpy as np
+from sumeval.metrics.lang import get_lang
+
+# punctuation -> space (the normalization of the titles sent to the search API)
+PUNCTUATION:Dict[int, str] = str.maketrans(string.punctuation, ' ' * len(string.punctuation))
+# ascii characters other than [A-Za-z0-9] -> space (the tokenizer of sumeval for english)
+SEPARATORS:Dict[int, str] = {c: ' ' for c in range(128) if not chr(c).isalnum()}
+NON_ALNUM = re.compile(r'[^A-Za-z0-9]')
+# popcount of each byte
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+class TitleMatcher(object):
+    '''batched ROUGE-L scoring of a title against candidate titles
+
+    Gives the same scores as `RougeCalculator(stopwords=True, stemming=False, lang="en").rouge_l`
+    on lowercased titles: the titles are split on every character other than [A-Za-z0-9] and the stop words are dropped,
+    then the LCS of the query with all the candidates is computed at once by the bit-parallel algorithm
+    (one uint64 mask per query word position; queries longer than 64 words fall back to dynamic programming).
+
+    Args:
+        threshold (float): a candidate is accepted if its score is greater than this
+        alpha (float): weight of the precision in the F-measure (0.5 as rouge_l)
+    '''
+    WORD_BITS:int = 64
+
+    def __init__(self, threshold:float=0.95, alpha:float=0.5):
+        self.__threshold = threshold
+        self.__alpha = alpha
+        self.__lang = get_lang('en')
+        self.__stop_words:Dict[str, bool] = {}
+
+    @property
+    def threshold(self) -> float:
+        return self.__threshold
+
+    def tokenize(self, title:str) -> List[str]:
+        title = title.lower()
+        title = title.translate(SEPARATORS) if title.isascii() else NON_ALNUM.sub(' ', title)
+        return [word for word in title.split() if not self.__is_stop_word(word)]
+
+    def __is_stop_word(self, word:str) -> bool:
+        stop = self.__stop_words.get(word)
+        if stop is None:
+            stop = self.__stop_words[word] = self.__lang.is_stop_word(word)
+        return stop
+
+    def scores(self, query:str, candidates:Sequence[str]) -> np.ndarray:
+        '''ROUGE-L F-measure of the query (summary) against each candidate (reference)'''
+        query_words = self.tokenize(query)
+        candidate_words = [self.tokenize(candidate) for candidate in candidates]
+        lengths = np.array([len(words) for words in candidate_words], dtype=np.float64)
+        if len(query_words) == 0 or len(candidates) == 0:
+            return np.zeros(len(candidates))
+
+        if len(query_words) <= self.WORD_BITS:
+            matches = self.__lcs_bits(query_words, candidate_words)
+        else:
+            matches = np.array([self.__lcs(query_words, words) for words in candidate_words], dtype=np.float64)
+
+        # same operations as RougeCalculator._calc_f1, so that the scores are equal to the last bit
+        recall = np.divide(matches, lengths, out=np.zeros(len(candidates)), where=0 < lengths)
+        precision = matches / len(query_words)
+        denom = (1.0 - self.__alpha) * precision + self.__alpha * recall
+        return np.divide(precision * recall, denom, out=np.zeros(len(candidates)), where=denom != 0)
+
+    @staticmethod
+    def __lcs_bits(query_words:List[str], candidate_words:List[List[str]]) -> np.ndarray:
+        '''LCS lengths by Hyyrö's bit-vector algorithm, over all the candidates at once'''
+        masks:Dict[str, int] = {}
+        for i, word in enumerate(query_words):
+            masks[word] = masks.get(word, 0) | (1 << i)
+        width = max((len(words) for words in candidate_words), default=0)
+        # column j: masks of the j-th words of the candidates (0 for the missing words, which leaves v as is)
+        table = np.zeros((width, len(candidate_words)), dtype=np.uint64)
+        for c, words in enumerate(candidate_words):
+            table[:len(words), c] = [masks.get(word, 0) for word in words]
+
+        v = np.full(len(candidate_words), np.iinfo(np.uint64).max, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            for column in table:
+                u = v & column
+                v = (v + u) | (v - u)
+        n = len(query_words)
+        unmatched = v & np.uint64((1 << n) - 1) if n < 64 else v
+        return n - POPCOUNT[unmatched.view(np.uint8)].reshape(-1, 8).sum(axis=1).astype(np.float64)
+
+    @staticmethod
+    def __lcs(a:List[str], b:List[str]) -> int:
+        row = [0] * (len(b) + 1)
+        for word in a:
+            upper_left = 0
+            for j, other in enumerate(b):
+                up = row[j + 1]
+                row[j + 1] = upper_left + 1 if word == other else max(row[j], up)
+                upper_left = up
+        return row[-1]
+
+    def match(self, query:str, candidates:Sequence[str]) -> int:
+        '''index of the first candidate accepted by the threshold (-1 if none)'''
+        accepted = np.flatnonzero(self.scores(query, candidates) > self.__threshold)
+        return int(accepted[0]) if 0 < len(accepted) else -1
+
+    def best(self, query:str, candidates:Sequence[str]) -> Tuple[int, float]:
+        '''index and score of the best candidate accepted by the threshold ((-1, 0.0) if none)'''
+        scores = self.scores(query, candidates)
+        if len(scores) == 0:
+            return -1, 0.0
+        index = int(np.argmax(scores))
+        return (index, float(scores[index])) if scores[index] > self.__threshold else (-1, 0.0)